@@ -0,0 +1,76 @@
+"""
+Compares two result files written by `benchmarks/run.py`:
+
+    python benchmarks/compare.py before.json after.json
+"""
+
+from __future__ import print_function, unicode_literals
+
+import io
+import json
+
+import click
+
+
+METRICS = [
+    ('seconds', 'time', '{:.3f}s'),
+    ('peak_memory', 'memory', '{:.0f}B'),
+    ('entries_per_second', 'throughput', '{:.0f}/s'),
+]
+
+
+def load(path):
+    with io.open(path, encoding='utf8') as fh:
+        return json.load(fh)
+
+
+def ratio(old, new):
+    if not old or new is None:
+        return None
+    return new / old
+
+
+@click.command()
+@click.option('--threshold', type=float, default=None)
+@click.argument('before', type=click.Path(exists=True, dir_okay=False))
+@click.argument('after', type=click.Path(exists=True, dir_okay=False))
+def main(before, after, threshold):
+    """Shows the change of each metric between two benchmark runs.
+
+    With --threshold, exits with a non-zero status if the time of any
+    benchmark grew by more than the given factor (e.g. 1.1 for 10%).
+    """
+    before, after = load(before), load(after)
+
+    if before['parameters'] != after['parameters']:
+        click.secho('Warning: the runs used different parameters.',
+                    fg='yellow', err=True)
+
+    regressions = []
+    for name in sorted(set(before['benchmarks']) | set(after['benchmarks'])):
+        old = before['benchmarks'].get(name)
+        new = after['benchmarks'].get(name)
+        if old is None or new is None:
+            click.echo('{:<10} only in {}'.format(
+                name, 'after' if old is None else 'before'))
+            continue
+
+        cells = []
+        for key, label, fmt in METRICS:
+            r = ratio(old.get(key), new.get(key))
+            if r is None:
+                cells.append('{} -'.format(label))
+                continue
+            cells.append('{} {} -> {} (x{:.2f})'.format(
+                label, fmt.format(old[key]), fmt.format(new[key]), r))
+            if key == 'seconds' and threshold is not None and r > threshold:
+                regressions.append(name)
+        click.echo('{:<10} {}'.format(name, '  '.join(cells)))
+
+    if regressions:
+        raise click.ClickException('Slower than the threshold: {}'.format(
+            ', '.join(regressions)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark of the startup time of the commands.
+
+Each command module is imported in a fresh interpreter, measuring the time
+spent importing it and the wall time of the whole process, and checking
+that it does not load modules it does not need. Run from the root of the
+repository:
+
+    python benchmarks/imports.py -o imports.json
+
+and compare two result files with `benchmarks/compare.py`.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import collections
+
+import click
+
+
+RESULTS_VERSION = 1
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules each command must not load just by being imported
+COMMANDS = collections.OrderedDict([
+    ('msgnorm', ['openpyxl', 'multiprocessing', 'cProfile', 'tempfile']),
+    ('msgstats', ['openpyxl', 'multiprocessing']),
+    ('msgdiff', ['openpyxl', 'multiprocessing']),
+    ('msgfromxls', ['openpyxl', 'multiprocessing']),
+    ('msgtoxls', ['multiprocessing']),
+])
+
+SCRIPT = '''
+import sys, time, json
+timer = getattr(time, 'perf_counter', time.time)
+start = timer()
+import {module}
+seconds = timer() - start
+print(json.dumps({{'seconds': seconds, 'modules': sorted(sys.modules)}}))
+'''
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+def run(module):
+    """
+    Imports the given module in a new interpreter, returning the wall time
+    of the process, the time spent importing and the loaded modules.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    start = timer()
+    output = subprocess.check_output(
+        [sys.executable, '-c', SCRIPT.format(module=module)], env=env)
+    wall = timer() - start
+    result = json.loads(output.decode('utf8').strip().splitlines()[-1])
+    return wall, result['seconds'], result['modules']
+
+
+def measure(module, repeat, forbidden=()):
+    walls, imports = [], []
+    for i in range(repeat):
+        wall, seconds, modules = run(module)
+        walls.append(wall)
+        imports.append(seconds)
+
+    loaded = [name for name in forbidden if name in modules]
+    best = min(walls)
+    return {
+        'seconds': best,
+        'mean_seconds': sum(walls) / len(walls),
+        'runs': walls,
+        'import_seconds': min(imports),
+        'modules': len(modules),
+        'unexpected_modules': loaded,
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+    }
+
+
+@click.command()
+@click.option('--repeat', '-r', type=int, default=10)
+@click.option('--command', '-c', 'selected', multiple=True,
+              type=click.Choice(list(COMMANDS)))
+@click.option('--output', '-o', type=click.File('w'))
+def main(repeat, selected, output):
+    """Measures the import time of each command in a fresh interpreter.
+
+    The wall time of the process (best and mean of the runs) is reported,
+    together with the time spent in the import of the command itself and
+    with the interpreter alone as baseline. Exits with a non-zero status if
+    a command loads one of the modules it is expected not to need.
+    """
+    results = collections.OrderedDict()
+    results['baseline'] = measure('sys', repeat)
+    for name, forbidden in COMMANDS.items():
+        if selected and name not in selected:
+            continue
+        results[name] = measure('i18n_utils.cli.' + name, repeat, forbidden)
+
+    failures = []
+    for name, result in results.items():
+        click.echo('{:<10} {:8.3f}s {:8.3f}s import {:>6} modules'.format(
+            name, result['seconds'], result['import_seconds'],
+            result['modules']))
+        if result['unexpected_modules']:
+            failures.append('{} ({})'.format(
+                name, ', '.join(result['unexpected_modules'])))
+
+    if output is not None:
+        output.write(json.dumps({
+            'version': RESULTS_VERSION,
+            'parameters': {'repeat': repeat},
+            'environment': environment(),
+            'benchmarks': results,
+        }, indent=2, sort_keys=True))
+        output.write('\n')
+
+    if failures:
+        raise click.ClickException('Unexpected imports: {}'.format(
+            ', '.join(failures)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Benchmarks of the export, import, normalization and rendering paths on
+synthetic locale folders.
+
+Run from the root of the repository:
+
+    python benchmarks/run.py --entries 5000 --locales 5 -o results.json
+
+and compare two result files with `benchmarks/compare.py`.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import contextlib
+import collections
+
+import click
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import polib  # NOQA
+import openpyxl  # NOQA
+
+import i18n_utils  # NOQA
+from i18n_utils import normalization, parsing  # NOQA
+from i18n_utils.cli import msgtoxls, msgfromxls, msgnorm  # NOQA
+
+import synthetic  # NOQA
+
+
+RESULTS_VERSION = 1
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+@contextlib.contextmanager
+def silenced():
+    stdout, stderr = sys.stdout, sys.stderr
+    with io.open(os.devnull, 'w') as devnull:
+        sys.stdout = sys.stderr = devnull
+        try:
+            yield
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+
+def invoke(command, args):
+    with silenced():
+        command.main([str(a) for a in args], standalone_mode=False)
+
+
+class Fixture(object):
+    """
+    Synthetic locale folder, together with an edited copy of it exported to
+    a workbook, shared by all the benchmarks of a run.
+    """
+
+    def __init__(self, root, entries, locales, domains, **kwargs):
+        self.root = root
+        self.entries = entries
+        self.folder = os.path.join(root, 'locale')
+        self.locales = synthetic.generate_locale_folder(
+            self.folder, locales, domains, entries=entries, **kwargs)
+
+        edited = os.path.join(root, 'edited')
+        synthetic.edit_locale_folder(self.folder, edited,
+                                     seed=kwargs.get('seed', 0))
+        self.workbook = os.path.join(root, 'edited.xlsx')
+        invoke(msgtoxls.main, self.locale_args() + [self.workbook, edited])
+
+        self.count = entries * len(self.locales) * domains
+
+    def locale_args(self):
+        args = []
+        for locale in self.locales:
+            args.extend(['-l', locale])
+        return args
+
+    def copy(self, name):
+        path = os.path.join(self.root, name)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        shutil.copytree(self.folder, path)
+        return path
+
+
+# Each benchmark prepares a single run and returns the function to measure
+
+def bench_export(fixture):
+    out = os.path.join(fixture.root, 'export.xlsx')
+    args = fixture.locale_args() + [out, fixture.folder]
+    return lambda: invoke(msgtoxls.main, args)
+
+
+def bench_import(fixture):
+    folder = fixture.copy('import')
+    args = ['--skip', 3, '--batch', '--quiet', fixture.workbook,
+            'rw:' + folder]
+    return lambda: invoke(msgfromxls.main, args)
+
+
+def bench_normalize(fixture):
+    folder = fixture.copy('normalize')
+    return lambda: invoke(msgnorm.main, [folder])
+
+
+def bench_render(fixture):
+    pofiles = [pofile for locale, pofile in parsing.LocaleFolder(
+        fixture.folder).pofiles(klass=normalization.NormalizedPOFile)]
+
+    def run():
+        for pofile in pofiles:
+            pofile.__unicode__()
+    return run
+
+
+def bench_stats(fixture):
+    folder = parsing.LocaleFolder(fixture.folder)
+    return lambda: list(folder.stats())
+
+
+BENCHMARKS = collections.OrderedDict([
+    ('export', bench_export),
+    ('import', bench_import),
+    ('normalize', bench_normalize),
+    ('render', bench_render),
+    ('stats', bench_stats),
+])
+
+
+def measure(bench, fixture, repeat):
+    times = []
+    for i in range(repeat):
+        run = bench(fixture)
+        start = timer()
+        run()
+        times.append(timer() - start)
+
+    peak_memory = None
+    if tracemalloc is not None:
+        # Measured on a separate run, as tracing slows down allocations
+        run = bench(fixture)
+        tracemalloc.start()
+        try:
+            run()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    best = min(times)
+    return {
+        'seconds': best,
+        'mean_seconds': sum(times) / len(times),
+        'runs': times,
+        'peak_memory': peak_memory,
+        'entries': fixture.count,
+        'entries_per_second': fixture.count / best if best else None,
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'i18n_utils': i18n_utils.__version__,
+        'polib': polib.__version__,
+        'openpyxl': openpyxl.__version__,
+    }
+
+
+@click.command()
+@click.option('--entries', '-n', type=int, default=2000)
+@click.option('--locales', '-l', type=int, default=3)
+@click.option('--domains', '-d', type=int, default=1)
+@click.option('--plural-ratio', type=float, default=0.1)
+@click.option('--occurrences', type=int, default=3)
+@click.option('--seed', type=int, default=0)
+@click.option('--repeat', '-r', type=int, default=3)
+@click.option('--benchmark', '-b', 'selected', multiple=True,
+              type=click.Choice(list(BENCHMARKS)))
+@click.option('--output', '-o', type=click.File('w'))
+def main(entries, locales, domains, plural_ratio, occurrences, seed, repeat,
+         selected, output):
+    """Runs the benchmarks on a synthetic locale folder.
+
+    Wall time (best and mean of the runs), peak memory allocated by Python
+    and throughput in entries per second are reported for each benchmark
+    and optionally saved as JSON to be compared with compare.py.
+    """
+    parameters = collections.OrderedDict([
+        ('entries', entries),
+        ('locales', locales),
+        ('domains', domains),
+        ('plural_ratio', plural_ratio),
+        ('occurrences', occurrences),
+        ('seed', seed),
+        ('repeat', repeat),
+    ])
+
+    root = tempfile.mkdtemp(prefix='i18n-utils-bench-')
+    try:
+        click.echo('Generating {} entries x {} locales x {} domains...'
+                   .format(entries, locales, domains), err=True)
+        fixture = Fixture(root, entries, locales, domains,
+                          plural_ratio=plural_ratio, occurrences=occurrences,
+                          seed=seed)
+
+        results = collections.OrderedDict()
+        for name, bench in BENCHMARKS.items():
+            if selected and name not in selected:
+                continue
+            result = results[name] = measure(bench, fixture, repeat)
+            click.echo('{:<10} {:8.3f}s {:>12} entries/s {:>10} KiB'.format(
+                name, result['seconds'],
+                int(result['entries_per_second'] or 0),
+                '-' if result['peak_memory'] is None
+                else result['peak_memory'] // 1024))
+    finally:
+        shutil.rmtree(root)
+
+    if output is not None:
+        output.write(json.dumps({
+            'version': RESULTS_VERSION,
+            'parameters': parameters,
+            'environment': environment(),
+            'benchmarks': results,
+        }, indent=2, sort_keys=True))
+        output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
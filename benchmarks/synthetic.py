@@ -0,0 +1,137 @@
+"""
+Generators of synthetic locale folders for the benchmarks.
+
+The generated catalogs are deterministic for a given seed, so that results
+of different runs can be compared.
+"""
+
+import os
+import random
+import shutil
+
+import polib
+
+
+LOCALES = ['en', 'de', 'fr', 'it', 'es', 'pt', 'nl', 'sv', 'da', 'fi', 'pl',
+           'cs', 'hu', 'ro', 'el', 'tr', 'ru', 'uk', 'ja', 'ko', 'zh']
+
+WORDS = ('the of and to in is you that it he was for on are as with his they '
+         'at be this have from or one had by word but not what all were we '
+         'when your can said there use an each which she do how their if will '
+         'up other about out many then them these so some her would make like '
+         'him into time has look two more write go see number no way could '
+         'people my than first water been call who oil its now find long down '
+         'day did get come made may part account settings password message '
+         'invoice customer payment address delivery subscription').split()
+
+
+def locale_names(count):
+    """
+    Returns `count` locale names, the first one being the key locale `en`.
+    """
+    names = LOCALES[:count]
+    names.extend('x{}'.format(i) for i in range(count - len(names)))
+    return names
+
+
+def sentence(rng, min_words=2, max_words=14):
+    return ' '.join(rng.choice(WORDS)
+                    for i in range(rng.randint(min_words, max_words)))
+
+
+def generate_catalog(path, locale, entries, plural_ratio=0.1, occurrences=3,
+                     translated_ratio=0.8, fuzzy_ratio=0.05,
+                     obsolete_ratio=0.02, seed=0):
+    """
+    Writes a PO file with the given number of entries for the given locale.
+
+    The msgids only depend on the seed, so catalogs generated with the same
+    seed for different locales share their keys.
+    """
+    keys = random.Random(seed)
+    states = random.Random('{}-{}'.format(seed, locale))
+
+    pofile = polib.POFile(wrapwidth=78)
+    pofile.metadata = {
+        'Project-Id-Version': 'benchmark',
+        'Language': locale,
+        'MIME-Version': '1.0',
+        'Content-Type': 'text/plain; charset=UTF-8',
+        'Content-Transfer-Encoding': '8bit',
+        'Plural-Forms': 'nplurals=2; plural=(n != 1);',
+    }
+
+    for i in range(entries):
+        msgid = '{} {}'.format(sentence(keys), i)
+        plural = keys.random() < plural_ratio
+        references = [('src/module{}.py'.format(keys.randint(0, 50)),
+                       str(keys.randint(1, 2000)))
+                      for j in range(occurrences)]
+
+        translated = states.random() < translated_ratio
+        if locale == 'en' or translated:
+            translation = '{} {} {}'.format(locale, sentence(states), i)
+        else:
+            translation = ''
+
+        entry = polib.POEntry(msgid=msgid, occurrences=references)
+        if plural:
+            entry.msgid_plural = msgid + 's'
+            entry.msgstr_plural = {0: translation, 1: translation and
+                                   translation + 's'}
+        else:
+            entry.msgstr = translation
+
+        if translation and states.random() < fuzzy_ratio:
+            entry.flags.append('fuzzy')
+        if states.random() < obsolete_ratio:
+            entry.obsolete = True
+            entry.occurrences = []
+
+        pofile.append(entry)
+
+    pofile.save(path)
+
+
+def generate_locale_folder(root, locales=3, domains=1, **kwargs):
+    """
+    Generates a locale folder with a catalog for each of the given number of
+    locales and domains, returning the list of locale names.
+
+    The remaining keyword arguments are passed to `generate_catalog`.
+    """
+    names = locale_names(locales)
+    seed = kwargs.pop('seed', 0)
+    for locale in names:
+        folder = os.path.join(root, locale, 'LC_MESSAGES')
+        os.makedirs(folder)
+        for d in range(domains):
+            path = os.path.join(folder, 'domain{}.po'.format(d))
+            generate_catalog(path, locale, seed=seed + d, **kwargs)
+    return names
+
+
+def edit_locale_folder(src, dst, ratio=0.2, seed=0):
+    """
+    Copies the locale folder `src` to `dst`, changing the translation of the
+    given ratio of the entries. Exporting the copy gives a workbook to be
+    imported back into `src`.
+    """
+    rng = random.Random(seed)
+    shutil.copytree(src, dst)
+    for dirpath, dirnames, filenames in os.walk(dst):
+        for name in sorted(filenames):
+            if not name.endswith('.po'):
+                continue
+            path = os.path.join(dirpath, name)
+            pofile = polib.pofile(path)
+            for entry in pofile:
+                if rng.random() >= ratio:
+                    continue
+                if entry.msgid_plural:
+                    entry.msgstr_plural = dict(
+                        (k, 'edited {}'.format(v))
+                        for k, v in entry.msgstr_plural.items())
+                else:
+                    entry.msgstr = 'edited {}'.format(entry.msgstr)
+            pofile.save(path)
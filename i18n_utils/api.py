@@ -0,0 +1,160 @@
+"""
+Export and import of translations from Python code.
+
+These functions work on catalogs which are already loaded, so that a long
+running process can export and import many workbooks without spawning the
+command line tools and without parsing shared catalogs again. Catalogs are
+given as `(locale, catalog)` pairs, as returned by `load_catalogs`.
+"""
+
+import io
+import collections
+
+import six
+
+from i18n_utils import parsing, instrumentation, xlsx_reader
+from i18n_utils.cli import msgtoxls, msgfromxls
+
+
+def load_catalogs(folder, locales=None, jobs=1, on_error=None, cache=None):
+    """
+    Parses the PO files of the given locale folder (a path or a
+    `parsing.LocaleFolder`), returning a list of `(locale, polib.POFile)`
+    pairs which can be both exported and imported into.
+    """
+    if isinstance(folder, six.string_types):
+        folder = parsing.LocaleFolder(folder)
+    return list(folder.pofiles(locales=locales, jobs=jobs, on_error=on_error,
+                               cache=cache, wrapwidth=78))
+
+
+def export_workbook(catalogs, locales=None, key_locale='en',
+                    title='My project', out=None, autoheight=True,
+                    exact_heights=False, max_occurrences=None, select=None,
+                    timings=None):
+    """
+    Exports the given catalogs to a workbook, as msgtoxls does.
+
+    The catalogs can be `polib.POFile` instances or `records.Catalog` lists.
+    The locales default to the ones of the catalogs, in order. If given,
+    only the rows for which `select(row)` is true are exported, see
+    `delta.row_filter`. The workbook is written to `out` (a path or a
+    binary file object) if given and returned as bytes otherwise.
+    """
+    if timings is None:
+        timings = instrumentation.Timings('export')
+    catalogs = list(catalogs)
+    if locales is None:
+        locales = []
+        for locale, catalog in catalogs:
+            if locale not in locales:
+                locales.append(locale)
+    locales = list(locales)
+
+    entries = msgtoxls.merge_catalogs(catalogs, locales, key_locale, timings)
+    if select is not None:
+        with timings.phase('filter'):
+            entries.filter(select)
+    wb = msgtoxls.build_workbook(
+        entries, locales, key_locale, title,
+        msgtoxls.get_line_counter(autoheight, exact_heights),
+        max_occurrences, timings)
+
+    buf = io.BytesIO() if out is None else out
+    with timings.phase('save'):
+        wb.save(buf)
+    timings.finish()
+    return buf.getvalue() if out is None else None
+
+
+# `counts` maps each language to the number of entries of each outcome,
+# `outcomes` lists all the outcomes but the up to date entries as dicts
+# (as written by `msgfromxls --report`), `changed` lists the changed
+# `(locale, catalog)` pairs and `written` the paths of the saved catalogs.
+ImportResult = collections.namedtuple('ImportResult', [
+    'counts', 'outcomes', 'changed', 'written'])
+
+
+class ResultReport(msgfromxls.Report):
+    """
+    Report collecting the outcomes instead of printing them.
+    """
+
+    def __init__(self):
+        super(ResultReport, self).__init__(quiet=True)
+        self.outcomes = []
+
+    def __call__(self, outcome, ctx, key, language=None, **details):
+        super(ResultReport, self).__call__(outcome, ctx, key, language,
+                                           **details)
+        if outcome != msgfromxls.UP_TO_DATE:
+            self.outcomes.append(msgfromxls.record(outcome, ctx, key,
+                                                   language, **details))
+
+
+def import_workbook(workbook, catalogs, languages=None, key_locale='en',
+                    read_only=(), skip=3, sheet=1, ctx_col=2, key_col=3,
+                    add=False, save=False, stream=True, timings=None):
+    """
+    Imports the translations of a workbook written by msgtoxls into the
+    given catalogs, as `msgfromxls --batch --quiet` does, and returns an
+    `ImportResult`.
+
+    The workbook is a path, a binary file object or bytes. The catalogs
+    must be `polib.POFile` instances; they are updated in place and, with
+    `save`, the changed ones are saved. Catalogs also in `read_only` are
+    only used to report differing translations. The pairs are looked up
+    in order and missing entries are added (with `add`) to the first
+    writable catalog of their language.
+
+    The translation column of each of the languages is found in the header
+    row; columns are one based. The languages default to the ones of the
+    catalogs but the key locale, whose column shows the keys of the
+    untranslated entries.
+    """
+    if timings is None:
+        timings = instrumentation.Timings('import')
+    if isinstance(workbook, six.binary_type):
+        workbook = io.BytesIO(workbook)
+
+    by_language = collections.OrderedDict()
+    for locale, catalog in catalogs:
+        by_language.setdefault(locale, []).append(catalog)
+    if languages is None:
+        languages = [l for l in by_language if l != key_locale]
+    read_only = set(id(catalog) for catalog in read_only)
+
+    with timings.phase('load'):
+        ws, rows, headers = xlsx_reader.read_sheet(workbook, sheet, skip,
+                                                   stream)
+    targets = xlsx_reader.detect_languages(headers, languages)
+    missing = set(languages) - set(l for l, c in targets)
+    if missing:
+        raise ValueError('No column found for: {}'.format(
+            ', '.join(sorted(missing))))
+
+    imports = []
+    with timings.phase('index'):
+        for language, col in targets:
+            pofiles = [(id(po) in read_only, po)
+                       for po in by_language.get(language, [])]
+            imports.append(msgfromxls.LanguageImport(
+                language, col - 1, pofiles, msgfromxls.EntryIndex(pofiles),
+                set()))
+
+    report = ResultReport()
+    with timings.phase('rows'):
+        count = msgfromxls.import_rows(rows, imports, ctx_col - 1,
+                                       key_col - 1, add, report)
+    timings.count('rows', count)
+
+    if save:
+        with timings.phase('save'):
+            msgfromxls.save_changed(imports, report)
+    timings.finish()
+
+    changed = [(imp.language, po) for imp in imports
+               for read_only, po in imp.pofiles if id(po) in imp.changed]
+    counts = dict((language, dict(counts))
+                  for language, counts in report.counts.items())
+    return ImportResult(counts, report.outcomes, changed, report.files)
@@ -0,0 +1,126 @@
+"""
+On-disk cache of parsed catalogs.
+
+Parsing a PO file with polib is much slower than loading a pickle of the
+result, so tools run back to back can share their parsed catalogs through
+a cache directory. Each cached catalog is keyed by the path and content
+hash of its file and by the parser and its options, so that changing any
+of them results in a cache miss.
+"""
+
+import os
+import hashlib
+
+from six.moves import cPickle as pickle
+
+import polib
+
+import i18n_utils
+from i18n_utils.normalization import file_digest
+
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+SUFFIX = '.pickle'
+
+
+def parser_signature(parser):
+    """
+    Describes a parsing function, usually a `functools.partial` wrapping
+    `polib.pofile` or `records.parse`, including its options.
+    """
+    func = getattr(parser, 'func', parser)
+    options = sorted((getattr(parser, 'keywords', None) or {}).items())
+    return '{}.{}{!r}'.format(func.__module__, func.__name__, options)
+
+
+class CatalogCache(object):
+    """
+    Directory of pickled catalogs, evicting the least recently used ones
+    once their total size exceeds `max_size` bytes.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, path, parser):
+        digest = hashlib.sha1()
+        for part in [i18n_utils.__version__, polib.__version__,
+                     parser_signature(parser), os.path.abspath(path),
+                     file_digest(path)]:
+            digest.update(part.encode('utf8'))
+        return digest.hexdigest()
+
+    def parse(self, parser, path):
+        """
+        Returns the cached result of `parser(path)`, parsing the file and
+        storing the result if it is not cached yet.
+        """
+        cached_path = os.path.join(self.directory,
+                                   self.key(path, parser) + SUFFIX)
+        try:
+            with open(cached_path, 'rb') as fh:
+                catalog = pickle.load(fh)
+        except Exception:
+            # Missing or unreadable, parse again
+            pass
+        else:
+            try:
+                # Keep track of the last use for the eviction
+                os.utime(cached_path, None)
+            except OSError:
+                pass
+            return catalog
+
+        catalog = parser(path)
+        self.store(cached_path, catalog)
+        return catalog
+
+    def store(self, cached_path, catalog):
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                if not os.path.isdir(self.directory):
+                    raise
+
+        # Only needed when storing, tempfile is slow to import
+        import tempfile
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump(catalog, fh, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, cached_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def evict(self):
+        """
+        Removes the least recently used catalogs until the total size of
+        the cache is within its limit.
+        """
+        if not os.path.isdir(self.directory):
+            return
+
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
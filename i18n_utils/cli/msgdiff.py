@@ -1,8 +1,88 @@
+from __future__ import print_function, unicode_literals
+
+import os
+import json
+
 import click
 
+from i18n_utils import diff, parsing
+
+
+# As for diff(1), 1 means that the catalogs differ
+ERROR_EXIT_CODE = 2
+
+COLORS = {
+    diff.ADDED: 'green',
+    diff.REMOVED: 'red',
+}
+
+
+def format_text(path, change):
+    ctx, msgid, msgid_plural = change.key
+    key = '{}:{}'.format(ctx, msgid) if ctx else msgid
+    lines = ['{}: {} "{}"'.format(path, change.kind, key)]
+    if change.kind == diff.CHANGED:
+        for label, msgstr in [('OLD', change.old), ('NEW', change.new)]:
+            if isinstance(msgstr, list):
+                for i, form in enumerate(msgstr):
+                    lines.append(' {}[{}]: "{}"'.format(label, i, form))
+            else:
+                lines.append(' {}: "{}"'.format(label, msgstr))
+    return '\n'.join(lines)
+
+
+def format_json(path, change):
+    ctx, msgid, msgid_plural = change.key
+    return json.dumps({
+        'file': path,
+        'change': change.kind,
+        'msgctxt': ctx,
+        'msgid': msgid,
+        'msgid_plural': msgid_plural,
+        'old': change.old,
+        'new': change.new,
+    }, sort_keys=True)
+
 
 @click.command()
-@click.argument('pofile1', type=click.File())
-@click.argument('pofile2', type=click.File())
-def main(pofile1, pofile2):
-    pass
+@click.option('--json/--text', 'as_json', default=False)
+@click.option('--jobs', '-j', type=int, default=1)
+@click.argument('old', type=click.Path(exists=True, resolve_path=True))
+@click.argument('new', type=click.Path(exists=True, resolve_path=True))
+def main(old, new, as_json, jobs):
+    """Shows the differences between two PO files or locale folders.
+
+    Entries are matched on their context, msgid and msgid_plural and are
+    reported as added, removed, changed (different translation), fuzzy
+    (fuzzy flag toggled), obsoleted or unobsoleted.
+
+    With --json, each change is printed as a JSON object on its own line.
+
+    As for diff(1), the exit status is 0 if the catalogs are the same, 1 if
+    they differ and 2 in case of trouble (e.g. a file could not be parsed).
+    """
+    errors = parsing.ParseErrors()
+
+    if os.path.isdir(old) and os.path.isdir(new):
+        changes = diff.diff_folders(parsing.LocaleFolder(old),
+                                    parsing.LocaleFolder(new), jobs, errors)
+    elif os.path.isfile(old) and os.path.isfile(new):
+        catalogs = [po for path, po in parsing.parse_pofiles(
+            [old, new], on_error=errors)]
+        errors.check(ERROR_EXIT_CODE)
+        changes = ((new, change) for change in diff.diff_catalogs(*catalogs))
+    else:
+        raise click.UsageError('OLD and NEW must be either two PO files or '
+                               'two locale folders.')
+
+    differ = False
+    for path, change in changes:
+        differ = True
+        if as_json:
+            click.echo(format_json(path, change))
+        else:
+            click.secho(format_text(path, change),
+                        fg=COLORS.get(change.kind, 'yellow'))
+
+    errors.check(ERROR_EXIT_CODE)
+    click.get_current_context().exit(int(differ))
@@ -2,29 +2,53 @@ from __future__ import print_function, unicode_literals
 
 import os
 import re
+import json
 import math
 import glob
+import collections
 
 import click
 import polib
-from openpyxl import load_workbook
+
+from i18n_utils import parsing, cache, instrumentation, xlsx_reader
+from i18n_utils.utils import memoize
+
+
+@memoize
+def terminal_width():
+    return click.get_terminal_size()[0]
 
 
 def hr(char='\u2500', width=None, **kwargs):
     if width is None:
-        width = click.get_terminal_size()[0]
+        width = terminal_width()
     mult = int(math.ceil(width * 1.0 / len(char)))
     click.secho((char * mult)[:width], **kwargs)
 
 
-def get_pofiles(locale_folders, language):
+def get_pofiles(locale_folders, language, jobs=1, on_error=None,
+                catalogs=None):
+    paths, read_only = [], {}
     for folder in locale_folders:
         rw_ro, folder = folder.split(':', 1)
         assert rw_ro in ['rw', 'ro']
-        read_only = rw_ro == 'ro'
         po_file = os.path.join(folder, language, 'LC_MESSAGES', '*.po')
-        for path in glob.glob(po_file):
-            yield read_only, polib.pofile(path, wrapwidth=78)
+        for path in sorted(glob.glob(po_file)):
+            paths.append(path)
+            read_only[path] = rw_ro == 'ro'
+
+    for path, po in parsing.parse_pofiles(paths, jobs, on_error,
+                                          cache=catalogs, wrapwidth=78):
+        yield read_only[path], po
+
+
+def project(rows, columns):
+    """
+    Reduces each row to the values of the given (zero based) columns, so that
+    the cells of a row can be released as soon as the row has been read.
+    """
+    for row in rows:
+        yield tuple(row[c].value if c < len(row) else None for c in columns)
 
 
 class MsgStr(object):
@@ -50,178 +74,414 @@ class MsgStr(object):
         return ''.join([space_before, value.strip(), space_after])
 
     def set(self, value):
+        """
+        Sets the translation, returning whether it changed.
+        """
+        if value == self.get():
+            return False
         if self.entry.msgid_plural:
             self.entry.msgstr_plural[self.multiplicity] = value
         else:
             self.entry.msgstr = value
+        return True
+
+
+class EntryIndex(object):
+    """
+    Lookup table over the entries of a set of PO files, keyed on the context
+    and the stripped msgid (or msgid_plural).
+
+    Every key maps to the list of matching entries in file order; lookups
+    prefer the first non obsolete entry and fall back to the first obsolete
+    one.
+    """
+
+    def __init__(self, pofiles):
+        self._index = collections.defaultdict(list)
+        for read_only, po in pofiles:
+            for entry in po:
+                self.add(read_only, po, entry)
+
+    def add(self, read_only, po, entry):
+        match = (read_only, po, entry)
+        self._index['msgid', entry.msgctxt, entry.msgid.strip()].append(match)
+        if entry.msgid_plural:
+            key = 'msgid_plural', entry.msgctxt, entry.msgid_plural.strip()
+            self._index[key].append(match)
+
+    def lookup(self, st, by='msgid', msgctxt=None):
+        matches = self._index.get((by, msgctxt, st))
+        if not matches:
+            return None
+        for match in matches:
+            if not match[2].obsolete:
+                return match
+        return matches[0]
+
+
+# `changed` holds the ids of the catalogs which have to be saved
+LanguageImport = collections.namedtuple('LanguageImport', [
+    'language', 'trans_col', 'pofiles', 'index', 'changed'])
 
 
 @click.command()
+@instrumentation.instrument('msgfromxls')
 @click.option('--skip', type=int, default=0)
 @click.option('--ctx-col', '-c', type=int, default=2)
 @click.option('--key-col', '-k', type=int, default=3)
 @click.option('--trans-col', '-t', type=int, default=4)
 @click.option('--sheet', '-s', type=int, default=1)
 @click.option('--pretend/--no-pretend', '-p', default=False)
-@click.option('--language', '-l')
+@click.option('--language', '-l', 'languages', multiple=True)
+@click.option('--batch', is_flag=True)
+@click.option('--key-locale', default='en')
 @click.option('--add/--no-add', '-a')
 @click.option('--hide-ok/--show-ok', default=False)
+@click.option('--stream/--no-stream', default=True)
+@click.option('--jobs', '-j', type=int, default=1)
+@click.option('--cache-dir', type=click.Path(file_okay=False),
+              envvar='I18N_UTILS_CACHE_DIR')
+@click.option('--quiet', '-q', is_flag=True)
+@click.option('--report', 'report_file', type=click.File('w', lazy=False))
 @click.argument('workbook', type=click.Path(exists=True))
 @click.argument('locale_folders', nargs=-1)
-def main(workbook, locale_folders, language, key_col, trans_col, sheet,
-         pretend, hide_ok, ctx_col, skip, add):
-    wb = load_workbook(workbook)
-    ws = list(wb)[sheet-1]
-    rows = iter(ws.iter_rows())
-
-    for i in range(skip):
-        next(rows)
-    headers = next(rows)
-
-    if key_col is None or trans_col is None:
-        click.echo('The following columns are available:')
-        for i, cell in enumerate(headers):
-            if cell.value is not None:
-                click.echo('{:2d}. {}'.format(i + 1, cell.value))
-
-        if key_col is None:
-            key_col = click.prompt('Which column contains the key?',
-                                   type=int, default=1)
-
-        if trans_col is None:
-            trans_col = click.prompt('Which column contains the translation?',
-                                     type=int)
+def main(workbook, locale_folders, languages, batch, key_locale, key_col,
+         trans_col, sheet, pretend, hide_ok, ctx_col, skip, add, stream, jobs,
+         cache_dir, quiet, report_file, timings):
+    """Imports the translations of a workbook into the PO files of the given
+    locale folders, each prefixed by "rw:" or "ro:" (read-only).
+
+    With --batch, the translation columns of all the languages (or of the
+    ones given with --language) are detected from the header row written
+    by msgtoxls and imported in a single pass over the sheet. The key
+    locale (--key-locale, "en" by default, as for msgtoxls) is left out
+    unless given with --language, as its column shows the keys of the
+    untranslated entries.
+
+    With --quiet, only the summary is printed and no question is asked
+    (missing entries are only added with --add). With --report,
+    each updated, added, missing or read-only entry is written to the given
+    file as a JSON object on its own line. A summary of the outcomes is
+    printed at the end.
+    """
+    if len(languages) > 1 and not batch:
+        raise click.UsageError('Multiple languages require --batch.')
+
+    with timings.phase('load'):
+        ws, rows, headers = xlsx_reader.read_sheet(workbook, sheet, skip,
+                                                   stream)
+
+    if batch:
+        # The key locale column shows the keys of untranslated entries, so
+        # it is only imported if explicitly requested
+        available = languages or sorted(set(
+            language for folder in locale_folders
+            for language in parsing.LocaleFolder(
+                folder.split(':', 1)[1]).locales()
+            if language != key_locale))
+        targets = xlsx_reader.detect_languages(headers, available)
+        missing = set(languages) - set(l for l, c in targets)
+        if missing:
+            raise click.UsageError('No column found for: {}'.format(
+                ', '.join(sorted(missing))))
+    else:
+        if key_col is None or trans_col is None:
+            click.echo('The following columns are available:')
+            for i, value in enumerate(headers):
+                if value is not None:
+                    click.echo('{:2d}. {}'.format(i + 1, value))
 
-    ctx_col -= 1
-    key_col -= 1
-    trans_col -= 1
+            if key_col is None:
+                key_col = click.prompt('Which column contains the key?',
+                                       type=int, default=1)
 
-    hr(fg='yellow')
-    click.secho(' Selected sheet: {}'.format(ws.title))
-    click.secho(' Key column:     {}'.format(headers[key_col].value))
-    click.secho(' Value column:   {}'.format(headers[trans_col].value))
-    click.secho(' Language:       {}'.format(language))
-    hr(fg='yellow')
+            if trans_col is None:
+                trans_col = click.prompt(
+                    'Which column contains the translation?', type=int)
 
-    pofiles = list(get_pofiles(locale_folders, language))
+        targets = [(languages[0] if languages else None, trans_col)]
 
-    for row in rows:
-        ctx = row[ctx_col].value or None
-        key = row[key_col].value
-        plr = row[key_col + 1].value
-        trans = row[trans_col].value
-
-        # Check flag
-        flag = int(row[trans_col - 1].value)
-        fuzzy = (flag == 1)
-
-        if key is None and trans is None:
-            # This row can be safely ignored
-            continue
-
-        entry, msgstr, read_only = find_entry(pofiles, ctx, key, plr, trans)
-        if entry:
-            handle_entry(entry, msgstr, ctx, key, trans, fuzzy, hide_ok)
-        elif plr == 's':
-            # TODO: Support adding pluralized entries as well
-            if add or click.confirm('Do you want to add it to the file?'):
-                entry = polib.POEntry(
-                    msgid=key or '',
-                    msgstr=trans or '',
-                    msgctx=ctx or None,
-                )
-                for read_only, po in pofiles:
-                    if not read_only:
-                        po.append(entry)
-                        break
+    ctx_col -= 1
+    key_col -= 1
+
+    if not quiet:
+        hr(fg='yellow')
+        click.secho(' Selected sheet: {}'.format(ws.title))
+        click.secho(' Key column:     {}'.format(headers[key_col]))
+        if batch:
+            click.secho(' Languages:      {}'.format(', '.join(
+                '{} (column {})'.format(l, c) for l, c in targets)))
+        else:
+            click.secho(' Value column:   {}'.format(headers[trans_col - 1]))
+            click.secho(' Language:       {}'.format(targets[0][0]))
+        hr(fg='yellow')
+
+    errors = parsing.ParseErrors()
+    catalogs = cache.CatalogCache(cache_dir) if cache_dir else None
+    imports = []
+    for language, col in targets:
+        with timings.phase('parse'):
+            pofiles = list(get_pofiles(locale_folders, language, jobs,
+                                       errors, catalogs))
+        timings.count('files', len(pofiles))
+        with timings.phase('index'):
+            index = EntryIndex(pofiles)
+        imports.append(LanguageImport(language, col - 1, pofiles, index,
+                                      set()))
+    errors.check()
+
+    report = Report(quiet, hide_ok, report_file)
+    with timings.phase('rows'):
+        count = import_rows(rows, imports, ctx_col, key_col, add, report,
+                            batch)
+    timings.count('rows', count)
 
     if not pretend:
-        for read_only, po in pofiles:
-            if not read_only:
+        with timings.phase('save'):
+            written = save_changed(imports, report, batch)
+        timings.count('written', written)
+
+    report.summary()
+
+
+def import_rows(rows, imports, ctx_col, key_col, add, report, batch=True):
+    """
+    Imports the translations of the given rows for each `LanguageImport`,
+    with zero based context and key columns. Returns the number of rows.
+    """
+    columns = [ctx_col, key_col, key_col + 1]
+    for imp in imports:
+        columns.extend([imp.trans_col - 1, imp.trans_col])
+
+    count = 0
+    for values in project(rows, columns):
+        count += 1
+        ctx, key, plr = values[:3]
+        ctx = ctx or None
+        for i, imp in enumerate(imports):
+            flag, trans = values[3 + 2 * i:5 + 2 * i]
+            import_translation(imp, ctx, key, plr, flag, trans, add,
+                               report, imp.language if batch else None)
+    return count
+
+
+def save_changed(imports, report, batch=True):
+    """
+    Saves the catalogs changed by the given imports, returning their number.
+    """
+    written = 0
+    for imp in imports:
+        for read_only, po in imp.pofiles:
+            if id(po) in imp.changed:
                 po.save()
+                written += 1
+                report.written(po.fpath, imp.language if batch else None)
+    return written
 
 
-def find(pofile, st, by='msgid', include_obsolete_entries=False,
-         msgctxt=False):
-    if include_obsolete_entries:
-        entries = pofile[:]
-    else:
-        entries = [e for e in pofile if not e.obsolete]
-    for e in entries:
-        if getattr(e, by).strip() == st:
-            if msgctxt is not False and e.msgctxt != msgctxt:
-                continue
-            return e
-    return None
-
-
-def find_entry(pofiles, ctx, key, plr, trans):
-    msgstr = None
-    args_set = [
-        {'include_obsolete_entries': False},
-        {'include_obsolete_entries': True},
-    ]
-
-    for kwargs in args_set:
-        if plr == 'P':
-            kwargs['by'] = 'msgid_plural'
-        for read_only, po in pofiles:
-            entry = find(po, key, msgctxt=ctx, **kwargs)
-            if entry is not None:
-                msgstr = MsgStr(entry, plr == 'P')
-                break
-        if msgstr:
-            break
-    else:
+UP_TO_DATE = 'up-to-date'
+TRANSLATED = 'translated'
+UPDATED = 'updated'
+ADDED = 'added'
+NOT_FOUND = 'not-found'
+READ_ONLY = 'read-only'
+
+OUTCOMES = [UPDATED, TRANSLATED, ADDED, UP_TO_DATE, NOT_FOUND, READ_ONLY]
+
+
+def record(outcome, ctx, key, language=None, **details):
+    details.update(outcome=outcome, language=language, msgctxt=ctx,
+                   msgid=key)
+    return details
+
+
+def labeled(message, language=None):
+    if language is None:
+        return message
+    return '[{}] {}'.format(language, message)
+
+
+class Report(object):
+    """
+    Collects the outcome of each imported translation.
+
+    Outcomes are counted per language and, unless `quiet`, echoed as they
+    happen. If a file is given, every outcome but `UP_TO_DATE` is written to
+    it as a JSON object on its own line.
+    """
+
+    def __init__(self, quiet=False, hide_ok=False, fh=None):
+        self.quiet = quiet
+        self.hide_ok = hide_ok
+        self.fh = fh
+        self.counts = collections.defaultdict(collections.Counter)
+        self.files = []
+
+    def __call__(self, outcome, ctx, key, language=None, **details):
+        self.counts[language][outcome] += 1
+
+        if self.fh is not None and outcome != UP_TO_DATE:
+            self.fh.write(json.dumps(record(outcome, ctx, key, language,
+                                            **details),
+                                     sort_keys=True) + '\n')
+
+        if not self.quiet:
+            self.echo(outcome, ctx, key, language, **details)
+
+    def echo(self, outcome, ctx, key, language=None, **details):
+        if outcome == NOT_FOUND:
+            key = '{}:{}'.format(ctx, key) if ctx else key
+            click.secho(labeled('The entry "{}" was not found.'.format(key),
+                                language), fg='red')
+        elif outcome == READ_ONLY:
+            key = '{}:{}'.format(ctx, key)
+            click.secho(labeled(
+                'The entry "{}" has been translated as "{}" in "{}" but the '
+                'file is marked as read-only.'.format(
+                    key, details['current'], details['path']), language),
+                fg='red')
+        elif outcome == UP_TO_DATE:
+            if not self.hide_ok:
+                click.secho(labeled('The entry "{}" is already up to date.'
+                                    .format(key), language), fg='green')
+        elif outcome == TRANSLATED:
+            click.secho(labeled('The entry "{}" has not been translated yet.'
+                                .format(key), language), fg='yellow')
+        elif outcome == UPDATED:
+            hr()
+            click.secho(str(ctx))
+            click.secho(labeled('The entry "{}" was updated:'.format(key),
+                                language))
+            click.secho(' OLD: "{}"'.format(details['old']))
+            click.secho(' NEW: "{}"'.format(details['new']))
+            hr()
+
+    def written(self, path, language=None):
+        self.files.append(path)
+        if self.fh is not None:
+            self.fh.write(json.dumps({'outcome': 'written', 'path': path,
+                                      'language': language},
+                                     sort_keys=True) + '\n')
+
+    def confirm_add(self, language=None):
+        if self.quiet:
+            return False
+        return click.confirm(labeled('Do you want to add it to the file?',
+                                     language))
+
+    def summary(self):
+        for language in sorted(self.counts, key=lambda l: l or ''):
+            counts = self.counts[language]
+            click.echo(labeled(', '.join(
+                '{} {}'.format(counts[outcome], outcome)
+                for outcome in OUTCOMES), language))
+
+        click.echo('{} file(s) written{}'.format(
+            len(self.files), ':' if self.files else '.'))
+        for path in self.files:
+            click.echo('  {}'.format(path))
+
+
+def import_translation(imp, ctx, key, plr, flag, trans, add, report,
+                       language=None):
+    # Check flag
+    flag = int(flag)
+    fuzzy = (flag == 1)
+
+    if key is None and trans is None:
+        # This row can be safely ignored
+        return
+
+    outcome, po, entry, msgstr = find_entry(imp.index, ctx, key, plr, trans,
+                                            report, language)
+    if outcome == READ_ONLY:
+        # The entry exists, but can't be changed
+        return
+    if entry:
+        if handle_entry(entry, msgstr, ctx, key, trans, fuzzy, report,
+                        language):
+            imp.changed.add(id(po))
+    elif plr == 's':
+        # TODO: Support adding pluralized entries as well
+        if add or report.confirm_add(language):
+            entry = polib.POEntry(
+                msgid=key or '',
+                msgstr=trans or '',
+                msgctxt=ctx or None,
+            )
+            for read_only, po in imp.pofiles:
+                if not read_only:
+                    po.append(entry)
+                    imp.index.add(read_only, po, entry)
+                    imp.changed.add(id(po))
+                    report(ADDED, ctx, key, language, path=po.fpath,
+                           new=entry.msgstr)
+                    break
+
+
+def find_entry(index, ctx, key, plr, trans, report, language=None):
+    """
+    Looks up the entry of a row, returning an `(outcome, po, entry, msgstr)`
+    tuple. The outcome is `NOT_FOUND` if there is no such entry, `READ_ONLY`
+    if it is in a read-only file (the entry is not returned then) and
+    `None` otherwise.
+    """
+    match = index.lookup(key, by='msgid_plural' if plr == 'P' else 'msgid',
+                         msgctxt=ctx)
+    if match is None:
         # TODO: How do we want to handle this?
-        key = '{}:{}'.format(ctx, key) if ctx else key
-        click.secho('The entry "{}" was not found.'.format(key), fg='red')
-        return None, None, False
+        report(NOT_FOUND, ctx, key, language)
+        return NOT_FOUND, None, None, None
+
+    read_only, po, entry = match
+    msgstr = MsgStr(entry, plr == 'P')
 
     if read_only:
         if trans != msgstr.get():
-            key = '{}:{}'.format(ctx, key)
-            click.secho('The entry "{}" has been translated as "{}" in "{}" '
-                        'but the file is marked as read-only.'
-                        .format(key, msgstr.get(), po.fpath), fg='red')
-        return None, None, True
+            report(READ_ONLY, ctx, key, language, path=po.fpath,
+                   current=msgstr.get(), new=trans)
+        return READ_ONLY, po, None, None
+
+    return None, po, entry, msgstr
 
-    return entry, msgstr, False
 
+def unfuzzy(entry, fuzzy):
+    if 'fuzzy' in entry.flags and not fuzzy:
+        entry.flags.remove('fuzzy')
+        return True
+    return False
 
-def handle_entry(entry, msgstr, ctx, key, trans, fuzzy, hide_ok):
+
+def handle_entry(entry, msgstr, ctx, key, trans, fuzzy, report,
+                 language=None):
+    """
+    Updates the entry with the given translation, returning whether it was
+    changed.
+    """
     trans_norm = msgstr.normalize_whitespace(trans)
 
     if not trans or trans.strip() == msgstr.get().strip():
         # Already up to date
-        if not hide_ok:
-            click.secho('The entry "{}" is already up to date.'.format(key),
-                        fg='green')
+        report(UP_TO_DATE, ctx, key, language)
         if msgstr.get().strip():
-            msgstr.set(msgstr.normalize_whitespace(msgstr.get()))
+            changed = msgstr.set(msgstr.normalize_whitespace(msgstr.get()))
         else:
-            msgstr.set('')
-        if 'fuzzy' in entry.flags and not fuzzy:
-            entry.flags.remove('fuzzy')
-        entry.obsolete = False
-        return
+            changed = msgstr.set('')
+        changed = unfuzzy(entry, fuzzy) or changed
+        if entry.obsolete:
+            entry.obsolete = False
+            changed = True
+        return changed
 
     if not entry.translated():
         # Entry is in the file, but has not been translated
-        click.secho('The entry "{}" has not been translated yet.'
-                    .format(key), fg='yellow')
-        msgstr.set(trans_norm)
-        if 'fuzzy' in entry.flags and not fuzzy:
-            entry.flags.remove('fuzzy')
+        report(TRANSLATED, ctx, key, language, new=trans_norm)
+        changed = msgstr.set(trans_norm)
+        changed = unfuzzy(entry, fuzzy) or changed
         # entry.obsolete = False
-        return
+        return changed
 
     # Entry has been translated but needs update
     # TODO: Ask for confirmation
-    hr()
-    click.secho(str(ctx))
-    click.secho('The entry "{}" was updated:'.format(key))
-    click.secho(' OLD: "{}"'.format(msgstr.get()))
-    click.secho(' NEW: "{}"'.format(trans_norm))
-    msgstr.set(trans)
-    hr()
+    report(UPDATED, ctx, key, language, old=msgstr.get(), new=trans_norm)
+    return msgstr.set(trans)
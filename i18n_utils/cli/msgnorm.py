@@ -1,13 +1,24 @@
+import functools
+
 import click
 
-from i18n_utils import params, normalization
+from i18n_utils import params, parsing, normalization, instrumentation
+from i18n_utils import cache as catalog_cache
 
 
 @click.command()
+@instrumentation.instrument('msgnorm')
 @click.option('--wrap-width', '-w', 'wrapwidth',
               default=normalization.DEFAULT_WRAPPING_WIDTH)
+@click.option('--jobs', '-j', type=int, default=1)
+@click.option('--cache', 'cache_path', type=click.Path(dir_okay=False))
+@click.option('--check', is_flag=True)
+@click.option('--verbose', '-v', is_flag=True)
+@click.option('--cache-dir', type=click.Path(file_okay=False),
+              envvar='I18N_UTILS_CACHE_DIR')
 @click.argument('folders', nargs=-1, type=params.LocaleFolderParamType())
-def main(folders, wrapwidth):
+def main(folders, wrapwidth, jobs, cache_path, check, cache_dir, verbose,
+         timings):
     """Normalizes the PO files in the given locale folders.
 
     Useful to remove unecessary noise from source commits. The normalization
@@ -18,8 +29,97 @@ def main(folders, wrapwidth):
       sorted in line with current entries and not grouped together in the end)
     * Each occurrence is put on a line by itself, even if the wrapwidth would
       allow for more to be put on a single line
+
+    Files which cannot be parsed are reported and left untouched, without
+    interrupting the normalization of the other ones. With --jobs, the files
+    are normalized in parallel by as many worker processes; --verbose
+    reports the time spent on each file.
+
+    With --cache, the command runs incrementally: files recorded in the cache
+    as already normalized are skipped, and the others are only written if
+    their normalized content differs from the one on disk.
+
+    With --check, no file is written: the files which are not normalized
+    are listed and the command exits with a non-zero status if there are
+    any.
+
+    With --cache-dir, parsed files are loaded from and stored to the given
+    catalog cache directory, shared with msgtoxls and msgfromxls.
     """
-    for f in folders:
-        for locale, pofile in f.pofiles(
-                wrapwidth=wrapwidth, klass=normalization.NormalizedPOFile):
-            pofile.save()
+    errors = parsing.ParseErrors()
+    with timings.phase('scan'):
+        paths = [path for f in folders for path in f.pofile_paths()]
+    timings.count('files', len(paths))
+
+    if check:
+        check_files(paths, wrapwidth, jobs, errors, timings)
+        return
+
+    if cache_path is None:
+        cache = None
+    else:
+        with timings.phase('cache'):
+            cache = normalization.NormalizationCache(cache_path, wrapwidth)
+            pending, skipped, checked, rewritten = [], 0, 0, 0
+            for path in paths:
+                if cache.is_normalized(path):
+                    skipped += 1
+                else:
+                    pending.append(path)
+            paths = pending
+
+    catalogs = catalog_cache.CatalogCache(cache_dir) if cache_dir else None
+    normalize = functools.partial(
+        normalization.normalize_file, wrapwidth=wrapwidth,
+        only_changed=cache is not None, catalogs=catalogs)
+
+    results = timings.iterate('normalize',
+                              parsing.imap(normalize, paths, jobs))
+    for path, result, error in results:
+        if error is not None:
+            errors(path, error)
+            continue
+
+        written, elapsed = result
+        if written:
+            timings.count('written')
+        if verbose:
+            click.echo('{} {} ({:.2f}s)'.format(
+                path, 'written' if written else 'unchanged', elapsed))
+
+        if cache is None:
+            continue
+
+        if written:
+            rewritten += 1
+        else:
+            checked += 1
+        cache.add(path)
+
+    if catalogs is not None:
+        catalogs.evict()
+
+    if cache is not None:
+        with timings.phase('cache'):
+            cache.save()
+        click.echo('{} skipped, {} checked, {} rewritten.'.format(
+            skipped, checked, rewritten))
+
+    errors.check()
+
+
+def check_files(paths, wrapwidth, jobs, errors, timings):
+    check = functools.partial(normalization.check_file, wrapwidth=wrapwidth)
+    unnormalized = 0
+    results = timings.iterate('check', parsing.imap(check, paths, jobs))
+    for path, normalized, error in results:
+        if error is not None:
+            errors(path, error)
+        elif not normalized:
+            click.echo(path)
+            unnormalized += 1
+
+    errors.check()
+    if unnormalized:
+        raise click.ClickException(
+            '{} file(s) are not normalized.'.format(unnormalized))
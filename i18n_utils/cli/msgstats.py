@@ -0,0 +1,79 @@
+from __future__ import print_function, unicode_literals
+
+import csv
+import json
+import collections
+
+import click
+
+from i18n_utils import params, parsing, stats, cache
+
+
+COLUMNS = ['folder', 'locale', 'domain'] + list(stats.Stats._fields) + [
+    'total', 'total_words', 'progress']
+
+
+def format_text(row):
+    name = '{locale}/{domain}' if row['domain'] else '{locale} (total)'
+    return (('{folder} ' + name + ': {progress}% translated '
+             '({translated} translated, {fuzzy} fuzzy, {untranslated} '
+             'untranslated, {obsolete} obsolete, {total_words} words)')
+            .format(**row))
+
+
+@click.command()
+@click.option('--locale', '-l', 'locales', multiple=True)
+@click.option('--format', '-f', 'output_format', default='text',
+              type=click.Choice(['text', 'json', 'csv']))
+@click.option('--totals', is_flag=True)
+@click.option('--jobs', '-j', type=int, default=1)
+@click.option('--cache-dir', type=click.Path(file_okay=False),
+              envvar='I18N_UTILS_CACHE_DIR')
+@click.argument('folders', nargs=-1, type=params.LocaleFolderParamType())
+def main(folders, locales, output_format, totals, jobs, cache_dir):
+    """Shows the translation progress of the PO files in the given locale
+    folders.
+
+    For each locale and domain, the number of translated, fuzzy,
+    untranslated and obsolete entries and the number of source words in
+    each of these states are reported. With --totals, the sum over the
+    domains of each locale of a folder is reported as well, after the files
+    of the folder, with an empty domain.
+
+    With --format json, each file is printed as a JSON object on its own
+    line; with --format csv, as a CSV row after a header row.
+
+    With --cache-dir, parsed files are loaded from and stored to the given
+    catalog cache directory, shared with the other commands.
+    """
+    errors = parsing.ParseErrors()
+    catalogs = cache.CatalogCache(cache_dir) if cache_dir else None
+
+    if output_format == 'csv':
+        writer = csv.DictWriter(click.get_text_stream('stdout'), COLUMNS)
+        writer.writeheader()
+
+    def output(folder, locale, domain, result):
+        row = result.as_dict()
+        row.update(folder=folder.path, locale=locale, domain=domain)
+
+        if output_format == 'json':
+            click.echo(json.dumps(row, sort_keys=True))
+        elif output_format == 'csv':
+            writer.writerow(row)
+        else:
+            click.echo(format_text(row))
+
+    for folder in folders:
+        by_locale = collections.OrderedDict()
+        for locale, domain, result in folder.stats(locales or None, jobs,
+                                                   errors, catalogs):
+            output(folder, locale, domain, result)
+            by_locale[locale] = by_locale.get(
+                locale, stats.Stats.empty()) + result
+
+        if totals:
+            for locale, result in by_locale.items():
+                output(folder, locale, None, result)
+
+    errors.check()
@@ -1,31 +1,133 @@
 from __future__ import print_function, unicode_literals
 
+import os
+import subprocess
 import collections
 from textwrap import wrap
 
 import click
 
-from openpyxl import Workbook
 from openpyxl.cell import get_column_letter
 
-from i18n_utils import styles, params
+from i18n_utils import styles, params, xlsx, matrix, cache, instrumentation
+from i18n_utils import delta, parsing
+from i18n_utils.utils import memoize
+
+
+# The entry fields read by the export
+FIELDS = ('msgctxt', 'msgid', 'msgid_plural', 'msgstr', 'msgstr_plural',
+          'flags', 'obsolete', 'occurrences')
 
 
 @click.command()
+@instrumentation.instrument('msgtoxls')
 @click.option('--locale', '-l', 'locales', multiple=True)
 @click.option('--key-locale', '-k', default='en')
 @click.option('--title', '-t', default='My project')
+@click.option('--jobs', '-j', type=int, default=1)
+@click.option('--autoheight/--no-autoheight', default=True)
+@click.option('--exact-heights', is_flag=True)
+@click.option('--max-occurrences', type=click.IntRange(min=1))
+@click.option('--cache-dir', type=click.Path(file_okay=False),
+              envvar='I18N_UTILS_CACHE_DIR')
+@click.option('--target', '-T', 'targets', multiple=True)
+@click.option('--untranslated', is_flag=True)
+@click.option('--fuzzy', is_flag=True)
+@click.option('--since-workbook', type=click.Path(exists=True,
+                                                  dir_okay=False))
+@click.option('--since-rev')
 @click.argument('out', type=click.Path(exists=False, dir_okay=False,
                                        writable=True))
 @click.argument('folders', nargs=-1, type=params.LocaleFolderParamType())
-def main(locales, key_locale, title, folders, out):
-    wb = Workbook()
-
+def main(locales, key_locale, title, folders, out, jobs, autoheight,
+         exact_heights, max_occurrences, cache_dir, targets, untranslated,
+         fuzzy, since_workbook, since_rev, timings):
+    """Exports the translations of the given locale folders to a workbook.
+
+    By default all the keys are exported. With --untranslated and --fuzzy,
+    only the keys which are untranslated or fuzzy in any of the target
+    locales (given with --target, all but the key locale by default) are.
+    With --since-workbook (a previous export) or --since-rev (a git
+    revision of the catalogs), the keys whose key locale or target locale
+    translations changed since then are exported as well.
+
+    With --max-occurrences N, at most N files are listed in the occurrences
+    of a key, each with at most N line numbers.
+    """
     if not locales:
         locales = list(folders[0].locales())
-
-    add_translations_wb(wb.active, folders, locales, key_locale, title)
-    wb.save(out)
+    locales = list(locales)
+
+    unknown = set(targets) - set(locales)
+    if unknown:
+        raise click.UsageError('Unknown target locales: {}'.format(
+            ', '.join(sorted(unknown))))
+    if since_workbook and since_rev:
+        raise click.UsageError(
+            '--since-workbook and --since-rev are mutually exclusive.')
+    if targets and not (untranslated or fuzzy or since_workbook or
+                        since_rev):
+        raise click.UsageError(
+            '--target requires --untranslated, --fuzzy, --since-workbook or '
+            '--since-rev.')
+
+    errors = parsing.ParseErrors()
+    catalogs = cache.CatalogCache(cache_dir) if cache_dir else None
+    entries = collect_entries(folders, locales, key_locale, jobs, errors,
+                              catalogs, timings)
+    errors.check()
+
+    with timings.phase('baseline'):
+        if since_workbook:
+            baseline = delta.Baseline.from_workbook(since_workbook, locales)
+        elif since_rev:
+            baseline = load_revision(folders, locales, key_locale, since_rev)
+        else:
+            baseline = None
+
+    select = delta.row_filter(locales, key_locale, targets or None,
+                              untranslated, fuzzy, baseline)
+    if select is not None:
+        with timings.phase('filter'):
+            entries.filter(select)
+        click.secho('Exporting {} key(s).'.format(len(entries)), fg='yellow')
+
+    wb = build_workbook(entries, locales, key_locale, title,
+                        get_line_counter(autoheight, exact_heights),
+                        max_occurrences, timings)
+    with timings.phase('save'):
+        wb.save(out)
+
+
+def load_revision(folders, locales, key_locale, revision):
+    """
+    Returns the `delta.Baseline` of the catalogs of the given folders as
+    they were at the given git revision.
+    """
+    def catalogs():
+        for folder in folders:
+            paths = folder.pofile_paths(locales)
+            for path, po in delta.revision_catalogs(paths, revision):
+                locale = os.path.basename(os.path.dirname(os.path.dirname(
+                    path)))
+                yield locale, po
+
+    try:
+        entries = merge_catalogs(catalogs(), locales, key_locale)
+    except subprocess.CalledProcessError:
+        raise click.BadParameter(
+            'Not a revision of the catalogs: {}'.format(revision),
+            param_hint='--since-rev')
+    return delta.Baseline.from_matrix(entries, key_locale)
+
+
+def get_line_counter(autoheight=True, exact_heights=False):
+    if not autoheight:
+        return None
+    elif exact_heights:
+        return num_lines
+    else:
+        return estimate_lines
 
 
 def coord(col, row):
@@ -34,243 +136,259 @@ def coord(col, row):
     return '{}{}'.format(col, row)
 
 
+@memoize(maxsize=1 << 16)
 def num_lines(s, chars=50):
     lines = s.split('\n')
     return sum(len(wrap(l, chars)) for l in lines)
 
 
-def add_row(ws, left, context, key, key_idx, entries, plural=False):
-    if plural:
-        def get_str(entry):
-            return entry.msgstr_plural[1].strip()
-    else:
-        def get_str(entry):
-            if entry.msgid_plural:
-                return entry.msgstr_plural[0].strip()
+@memoize(maxsize=1 << 16)
+def estimate_lines(s, chars=50):
+    """
+    Estimates the number of lines `num_lines` would return, by simulating
+    the greedy wrapping of `textwrap.wrap` on word lengths only.
+
+    Tabs are expanded and runs of spaces count with their width, as in
+    `textwrap.wrap`, but words are not broken on hyphens, so the estimate
+    can occasionally differ by a line.
+    """
+    total = 0
+    for line in s.split('\n'):
+        col, sep, first = 0, 0, True
+        for word in line.expandtabs().split(' '):
+            if not word:
+                # Runs of spaces split into empty words
+                sep += 1
+                continue
+
+            length = len(word)
+            if first:
+                # Leading whitespace is kept on the first line, unless the
+                # first word does not fit after it
+                first = False
+                total += 1
+                col, sep = (sep - 1) % chars + 1 if sep else 0, 0
+                if col + length > chars and length <= chars:
+                    col = 0
+
+            if col + sep + length <= chars:
+                col += sep + length
             else:
-                return entry.msgstr.strip()
-
-    pluralized = plural
-    if not pluralized:
-        for e in entries:
-            if e:
-                pluralized = bool(e.msgid_plural)
-                break
-
-    ws.append([''] * (len(entries) * 2 + 5 + left))
-    row_idx = len(ws.rows)
-    row = ws.rows[-1][left:]
-
-    occurrences = sum((entry.occurrences for entry in entries if entry), [])
-    occurrences_dict = collections.defaultdict(lambda: set())
-    for path, line in occurrences:
-        occurrences_dict[path].add(line)
-
-    def fmt(o, lines):
-        return '{}:{}'.format(o, ','.join(sorted(lines)))
-
-    occurrences = '\n'.join(fmt(*o) for o in sorted(occurrences_dict.items()))
+                # Whitespace at the end of a line is dropped
+                if length > chars and col + sep < chars:
+                    # A long word first fills up the current line
+                    length -= chars - col - sep
+                lines = (length - 1) // chars + 1
+                total += lines
+                col = length - (lines - 1) * chars
+            sep = 1
+    return total
+
+
+def line_sort_key(line):
+    return (0, int(line), '') if line.isdigit() else (1, 0, line)
+
+
+def aggregate_occurrences(occurrences, max_occurrences=None):
+    """
+    Merges the given lists of `(path, line)` references into the text of
+    the occurrences cell, with one line per file listing its line numbers
+    in numeric order.
+
+    If `max_occurrences` is given, at most that many files are listed, each
+    with at most that many line numbers, followed by "+N more" for the
+    omitted files or line numbers.
+    """
+    lines_by_path = collections.defaultdict(set)
+    for references in occurrences:
+        for path, line in references:
+            lines_by_path[path].add(line)
+
+    paths = sorted(lines_by_path)
+    omitted = 0
+    if max_occurrences is not None and len(paths) > max_occurrences:
+        paths, omitted = paths[:max_occurrences], len(paths) - max_occurrences
+
+    text = []
+    for path in paths:
+        lines = sorted(lines_by_path[path], key=line_sort_key)
+        if max_occurrences is not None and len(lines) > max_occurrences:
+            lines[max_occurrences:] = ['+{} more'.format(
+                len(lines) - max_occurrences)]
+        text.append('{}:{}'.format(path, ','.join(lines)))
+    if omitted:
+        text.append('+{} more'.format(omitted))
+    return '\n'.join(text)
+
+
+RowStyles = collections.namedtuple('RowStyles', [
+    'header', 'last_header', 'translation_cb', 'translation', 'comment',
+    'occurrences'])
+
+
+def register_row_styles(wb):
+    """
+    Registers the styles of the translation rows in the given workbook,
+    returning the `RowStyles` of the even and odd rows.
+    """
+    return [RowStyles(
+        header=xlsx.register_style(wb, styles.row_header(
+            is_odd=is_odd, is_last=False)),
+        last_header=xlsx.register_style(wb, styles.row_header(
+            is_odd=is_odd, is_last=True)),
+        translation_cb=xlsx.register_style(wb, styles.translation_cb_cell(
+            is_odd=is_odd)),
+        translation=xlsx.register_style(wb, styles.translation_cell(
+            is_odd=is_odd)),
+        comment=xlsx.register_style(wb, styles.comment_cell(is_odd=is_odd)),
+        occurrences=xlsx.register_style(wb, styles.occurrences_cell(
+            is_odd=is_odd)),
+    ) for is_odd in (0, 1)]
+
+
+def add_row(ws, row_idx, left, row, key_idx, line_counter=num_lines,
+            max_occurrences=None, row_styles=None):
+    is_odd = row_idx % 2
+    if row_styles is None:
+        row_styles = register_row_styles(ws.parent)
+    style = row_styles[is_odd]
+
+    context, key = row.ctx, row.key
+    occurrences = aggregate_occurrences(row.occurrences, max_occurrences)
 
     # Set row height
-    content = [context or '', key] + [get_str(e) for e in entries if e]
-    lines = max(num_lines(v) for v in content)
-    height = (lines + 1) * styles.line_height
-    height = max(height, 11 * num_lines(occurrences, 200) + 3)
-    ws.row_dimensions[row_idx].height = height
-
-    # Add context cell
-    ctx_cell = row[0]
-    ctx_cell.value = context
-    ctx_cell.style = styles.row_header(is_odd=row_idx % 2, is_last=False)
-
-    # Add key cell
-    key_cell = row[1]
-    key_cell.value = key
-    key_cell.style = styles.row_header(is_odd=row_idx % 2, is_last=False)
-
-    # Add plural cell
-    plr_cell = row[2]
-    plr_cell.value = 'P' if plural else 'p' if pluralized else 's'
-    plr_cell.style = styles.row_header(is_odd=row_idx % 2, is_last=True)
+    if line_counter is not None:
+        content = [context or '', key] + row.msgstrs
+        lines = max(line_counter(v) for v in content)
+        height = (lines + 1) * styles.line_height
+        height = max(height, 11 * line_counter(occurrences, 200) + 3)
+        xlsx.set_row_height(ws, row_idx, height)
+
+    cells = [None] * left
+
+    # Add context, key and plural cells
+    cells.append(xlsx.cell(ws, context, style.header))
+    cells.append(xlsx.cell(ws, key, style.header))
+    cells.append(xlsx.cell(
+        ws, 'P' if row.plural else 'p' if row.pluralized else 's',
+        style.last_header))
 
     # Add translations cells
-    row = row[3:]
-    for i, entry in enumerate(entries):
-        cb_cell = row[i * 2]
-        msgstr = get_str(entry) if entry else ''
-        if (entry and msgstr and 'fuzzy' not in entry.flags
-                and not entry.obsolete):
-            msg = msgstr
-            cb_cell.value = 2
-        elif entry and msgstr and 'fuzzy' in entry.flags:
-            msg = msgstr
-            cb_cell.value = 1
-        else:
-            if i == key_idx:
-                msg = key
-                cb_cell.value = 2
-            else:
-                msg = ''
-                cb_cell.value = 0
-
-        cb_cell.style = styles.translation_cb_cell(is_odd=row_idx % 2)
-
-        trans_cell = row[i * 2 + 1]
-        trans_cell.value = msg
-        trans_cell.style = styles.translation_cell(is_odd=row_idx % 2)
+    for flag, msg in matrix.displayed_translations(row, key_idx):
+        cells.append(xlsx.cell(ws, flag, style.translation_cb))
+        cells.append(xlsx.cell(ws, msg, style.translation))
 
     # Add comment
-    cmt_cell = row[-2]
-    cmt_cell.style = styles.comment_cell(is_odd=row_idx % 2)
+    cells.append(xlsx.cell(ws, None, style.comment))
 
     # Occurrences
-    occ_cell = row[-1]
-    occ_cell.style = styles.occurrences_cell(is_odd=row_idx % 2)
-    occ_cell.value = occurrences
-
-
-def add_translations_wb(ws, folders, locales, key_locale, title):
-    top = 4
-    left = 1
-
-    ws.title = 'Translations'
-
-    # Parse the PO files
-    entries = collections.defaultdict(lambda: [None] * len(locales))
-
-    for folder in folders:
-        po_files = [(locale, po) for locale, po in folder.pofiles()
-                    if locale in locales]
-
-        for locale, po in po_files:
-            click.secho('Parsing {}'.format(po.fpath), fg='yellow')
-            idx = locales.index(locale)
+    cells.append(xlsx.cell(ws, occurrences, style.occurrences))
+
+    ws.append(cells)
+
+
+def collect_entries(folders, locales, key_locale, jobs=1, on_error=None,
+                    catalogs=None, timings=None):
+    """
+    Merges the entries of the PO files of the given locales into a sorted
+    `matrix.TranslationMatrix`.
+    """
+    if timings is None:
+        timings = instrumentation.Timings()
+
+    def parsed():
+        for folder in folders:
+            po_files = folder.pofiles(locales=locales, jobs=jobs,
+                                      on_error=on_error, fields=FIELDS,
+                                      skip_obsolete=True, cache=catalogs)
+            for locale, po in timings.iterate('parse', po_files):
+                click.secho('Parsing {}'.format(po.fpath), fg='yellow')
+                yield locale, po
+
+    return merge_catalogs(parsed(), locales, key_locale, timings)
+
+
+def merge_catalogs(catalogs, locales, key_locale, timings=None):
+    """
+    Merges the entries of the given `(locale, catalog)` pairs into a sorted
+    `matrix.TranslationMatrix`. Catalogs can be `polib.POFile` instances or
+    `records.Catalog` lists; the ones of other locales are ignored.
+    """
+    if timings is None:
+        timings = instrumentation.Timings()
+    translations = matrix.TranslationMatrix(locales)
+
+    for locale, po in catalogs:
+        if locale not in locales:
+            continue
+        timings.count('files')
+        timings.count('entries', len(po))
+        with timings.phase('merge'):
             for entry in po:
                 if entry.obsolete:
                     continue
                 if locale == key_locale and not entry.msgstr:
                     continue
+                translations.add(locale, entry)
+
+    with timings.phase('sort'):
+        translations.sort()
+    return translations
+
+
+def build_workbook(entries, locales, key_locale, title,
+                   line_counter=num_lines, max_occurrences=None,
+                   timings=None):
+    """
+    Returns a write-only workbook holding the translations sheet of the
+    given `matrix.TranslationMatrix`, ready to be saved.
+    """
+    wb = xlsx.StreamingWorkbook()
+    add_translations_wb(wb.create_sheet(), entries, locales, key_locale,
+                        title, line_counter, max_occurrences, timings)
+    return wb
+
+
+def add_translations_wb(ws, entries, locales, key_locale, title,
+                        line_counter=num_lines, max_occurrences=None,
+                        timings=None):
+    """
+    Writes the translations sheet to the given write-only worksheet.
+
+    Rows are appended strictly in order, so everything depending on the
+    whole set of entries (header formulas, conditional formatting ranges,
+    frozen panes, ...) is computed before the first row is written.
+    """
+    top = 4
+    left = 1
 
-                key = entry.msgctxt, entry.msgid.strip(), False
-
-                try:
-                    current_entry = entries[key][idx]
-                except (KeyError, IndexError):
-                    pass
-                else:
-                    if current_entry:
-                        if current_entry.msgid_plural:
-                            current_entry.msgstr_plural[0].strip()
-                        else:
-                            msgstr = current_entry.msgstr.strip()
-
-                        if msgstr:
-                            continue
-
-                entries[key][idx] = entry
-
-                # Handle plurals
-                if not entry.msgid_plural:
-                    continue
-
-                key = entry.msgctxt, entry.msgid_plural.strip(), True
-
-                try:
-                    current_entry = entries[key][idx]
-                except (KeyError, IndexError):
-                    pass
-                else:
-                    if current_entry:
-                        if current_entry.msgstr_plural[1].strip():
-                            continue
-
-                entries[key][idx] = entry
-
-    entries = sorted(entries.items(), key=lambda e: (e[0][0], e[0][1].lower()))
+    ws.title = 'Translations'
     key_idx = locales.index(key_locale)
 
-    # Add the translations
-    # ws = wb.create_sheet()
-    ws.sheet_view.showGridLines = False
-
-    # Sheet title ############################################################
-    header = ws.cell(coord(left + 1, top - 2))
-    header.value = 'Translations for "{}"'.format(title)
-    header.style = styles.title_style
-
-    # Headers ################################################################
-    ctx_cell = ws.cell(coord(left + 1, top))
-    ctx_cell.style = styles.column_header()
-    ctx_cell.value = 'Context'
-
-    ws.merge_cells('{}:{}'.format(coord(left + 2, top), coord(left + 3, top)))
-    key_cell = ws.cell(coord(left + 2, top))
-    key_cell.style = styles.column_header()
-    key_cell.value = 'Key ({} entries)'.format(len(entries))
-    ws.cell(coord(left + 3, top)).style = styles.column_header()
-
-    for i, l in enumerate(locales):
-        from_cell = coord(i * 2 + 4 + left, top)
-        to_cell = coord(i * 2 + 4 + left + 1, top)
-        ws.merge_cells('{}:{}'.format(from_cell, to_cell))
-        locale_header_text = (
-            '=CONCATENATE('
-            '    "{name} (",'
-            '    ROUND(COUNTIF({start}:{end}, "=2")/{count} *100, 0),'
-            '    "% translated)"'
-            ')'
-        )
-        cell = ws.cell(from_cell)
-        cell.style = styles.column_header()
-        cell.value = locale_header_text.format(
-            name=l.upper(),
-            start=coord(i * 2 + 4 + left, top + 1),
-            end=coord(i * 2 + 4 + left, len(entries) + top + 1),
-            count=len(entries)
-        )
-        ws.cell(to_cell).style = styles.column_header()
-
-    cmt_cell = ws.cell(coord(len(locales) * 2 + 4 + left, top))
-    cmt_cell.style = styles.column_header()
-    cmt_cell.value = 'Comment'
-
-    occ_cell = ws.cell(coord(len(locales) * 2 + 5 + left, top))
-    occ_cell.style = styles.column_header()
-    occ_cell.value = 'Occurrences'
-
-    # Add translations #######################################################
-    for i, ((ctx, key, plural), translations) in enumerate(entries):
-        add_row(ws, left, ctx, key, key_idx, translations, plural=plural)
-
     # Column widths ##########################################################
 
     # Left offset
     for i in range(left):
-        ws.column_dimensions[get_column_letter(i + 1)].width = 5
+        xlsx.set_column_width(ws, i + 1, 5)
 
     # Context and key
-    ws.column_dimensions[get_column_letter(left + 1)].width = 30
-    ws.column_dimensions[get_column_letter(left + 2)].width = 50
-    ws.column_dimensions[get_column_letter(left + 3)].width = 5
+    xlsx.set_column_width(ws, left + 1, 30)
+    xlsx.set_column_width(ws, left + 2, 50)
+    xlsx.set_column_width(ws, left + 3, 5)
 
     # Translations
     for i in range(len(locales)):
         col = left + 4 + i * 2
-        ws.column_dimensions[get_column_letter(col)].width = 5
-        ws.column_dimensions[get_column_letter(col + 1)].width = 50
+        xlsx.set_column_width(ws, col, 5)
+        xlsx.set_column_width(ws, col + 1, 50)
 
     # Comment
     col = left + 4 + len(locales) * 2
-    ws.column_dimensions[get_column_letter(col)].width = 100
+    xlsx.set_column_width(ws, col, 100)
 
     # Occurrences
     col = left + 5 + len(locales) * 2
-    ws.column_dimensions[get_column_letter(col)].width = 80
-
-    # Row heights ############################################################
-    for i in range(top):
-        ws.row_dimensions[i + 1].height = 25
-    ws.row_dimensions[top].height = 40
+    xlsx.set_column_width(ws, col, 80)
 
     # Conditional formatting #################################################
     for i in range(len(locales)):
@@ -290,5 +408,63 @@ def add_translations_wb(ws, folders, locales, key_locale, title):
         )
 
     # Freeze and protect #####################################################
-    ws.freeze_panes = ws[coord(left + 4, top + 1)]
+    ws.sheet_view.showGridLines = False
+    ws.freeze_panes = coord(left + 4, top + 1)
     ws.protection.enable()
+
+    # Row heights ############################################################
+    for i in range(top):
+        xlsx.set_row_height(ws, i + 1, 25)
+    xlsx.set_row_height(ws, top, 40)
+
+    # Sheet title ############################################################
+    for i in range(1, top):
+        if i == top - 2:
+            ws.append([None] * left + [xlsx.cell(
+                ws, 'Translations for "{}"'.format(title),
+                styles.title_style())])
+        else:
+            ws.append([])
+
+    # Headers ################################################################
+    row = [None] * left
+    row.append(xlsx.cell(ws, 'Context', styles.column_header()))
+
+    ws.merge_cells('{}:{}'.format(coord(left + 2, top), coord(left + 3, top)))
+    row.append(xlsx.cell(ws, 'Key ({} entries)'.format(len(entries)),
+                         styles.column_header()))
+    row.append(xlsx.cell(ws, None, styles.column_header()))
+
+    for i, l in enumerate(locales):
+        from_cell = coord(i * 2 + 4 + left, top)
+        to_cell = coord(i * 2 + 4 + left + 1, top)
+        ws.merge_cells('{}:{}'.format(from_cell, to_cell))
+        locale_header_text = (
+            '=CONCATENATE('
+            '    "{name} (",'
+            '    ROUND(COUNTIF({start}:{end}, "=2")/{count} *100, 0),'
+            '    "% translated)"'
+            ')'
+        )
+        row.append(xlsx.cell(ws, locale_header_text.format(
+            name=l.upper(),
+            start=coord(i * 2 + 4 + left, top + 1),
+            end=coord(i * 2 + 4 + left, len(entries) + top + 1),
+            count=len(entries)
+        ), styles.column_header()))
+        row.append(xlsx.cell(ws, None, styles.column_header()))
+
+    row.append(xlsx.cell(ws, 'Comment', styles.column_header()))
+    row.append(xlsx.cell(ws, 'Occurrences', styles.column_header()))
+    ws.append(row)
+
+    # Add translations #######################################################
+    if timings is None:
+        timings = instrumentation.Timings()
+    row_styles = register_row_styles(ws.parent)
+    with timings.phase('rows'):
+        for i, row in enumerate(entries):
+            add_row(ws, top + 1 + i, left, row, key_idx,
+                    line_counter=line_counter,
+                    max_occurrences=max_occurrences, row_styles=row_styles)
+    timings.count('rows', len(entries))
@@ -0,0 +1,139 @@
+"""
+Selection of the rows of an export needing the attention of translators.
+
+Rows can be limited to the keys which are untranslated or fuzzy in the
+target locales, or which changed since a baseline: a previous export or a
+git revision of the catalogs. Both kinds of baselines are reduced to the
+cells they show in the workbook, so that they are compared the same way.
+"""
+
+import os
+import subprocess
+
+import polib
+
+from i18n_utils import matrix, xlsx_reader
+
+
+class Baseline(object):
+    """
+    Maps the `(msgctxt, msgid, plural)` key of each row of an export to the
+    `(status, msgstr)` cell shown for each locale.
+    """
+
+    def __init__(self):
+        self._cells = {}
+
+    def add(self, key, locale, cell):
+        self._cells.setdefault(key, {})[locale] = cell
+
+    def get(self, key, locale):
+        return self._cells.get(key, {}).get(locale)
+
+    def __len__(self):
+        return len(self._cells)
+
+    @classmethod
+    def from_matrix(cls, entries, key_locale):
+        baseline = cls()
+        key_idx = entries.locales.index(key_locale)
+        for row in entries:
+            key = row.ctx, row.key, row.plural
+            cells = matrix.displayed_translations(row, key_idx)
+            for locale, cell in zip(entries.locales, cells):
+                baseline.add(key, locale, cell)
+        return baseline
+
+    @classmethod
+    def from_workbook(cls, workbook, locales, sheet=1, skip=3, ctx_col=2,
+                      key_col=3):
+        """
+        Reads the rows of a workbook written by msgtoxls, for the given
+        locales having a column in it. Columns are one based.
+        """
+        baseline = cls()
+        ws, rows, headers = xlsx_reader.read_sheet(workbook, sheet, skip)
+        columns = xlsx_reader.detect_languages(headers, locales)
+        for row in rows:
+            values = [c.value for c in row]
+            values.extend([None] * (len(headers) - len(values)))
+            key = values[key_col - 1]
+            if key is None:
+                continue
+            key = (values[ctx_col - 1] or None, key, values[key_col] == 'P')
+            for locale, col in columns:
+                flag, msgstr = values[col - 2:col]
+                baseline.add(key, locale, (int(flag or 0), msgstr or ''))
+        return baseline
+
+
+def revision_catalogs(paths, revision):
+    """
+    Yields `(path, POFile)` pairs with the content of each of the given PO
+    files at the given git revision, skipping files not existing in it.
+    """
+    checked = set()
+    for path in paths:
+        folder, name = os.path.split(os.path.abspath(path))
+        if folder not in checked:
+            # Fails loudly if the folder is not in a repository or the
+            # revision does not exist
+            with open(os.devnull, 'w') as devnull:
+                subprocess.check_output(
+                    ['git', 'rev-parse', '--verify', '-q',
+                     '{}^{{commit}}'.format(revision)], cwd=folder,
+                    stderr=devnull)
+            checked.add(folder)
+
+        process = subprocess.Popen(
+            ['git', 'show', '{}:./{}'.format(revision, name)], cwd=folder,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        content, _ = process.communicate()
+        if process.returncode:
+            continue
+        # Decoded with the charset declared in the header of the catalog
+        encoding = polib.detect_encoding(content)
+        yield path, polib.pofile(content.decode(encoding), wrapwidth=78,
+                                 encoding=encoding)
+
+
+def row_filter(locales, key_locale, targets=None, untranslated=False,
+               fuzzy=False, baseline=None):
+    """
+    Returns a predicate selecting the `matrix.Row` instances which are
+    untranslated or fuzzy in any of the target locales (all but the key
+    locale by default), or whose cells in the key or target locales differ
+    from the `Baseline`, depending on the given options.
+
+    Returns `None` if no option is given, i.e. if all the rows are kept.
+    Target locales can't be given alone.
+    """
+    if not (untranslated or fuzzy or baseline is not None):
+        if targets:
+            raise ValueError('Target locales require untranslated, fuzzy '
+                             'or a baseline.')
+        return None
+
+    key_idx = locales.index(key_locale)
+    if targets is None:
+        targets = [l for l in locales if l != key_locale]
+    target_idxs = [locales.index(l) for l in targets]
+    compared = [(i, locales[i]) for i in sorted(set([key_idx] + target_idxs))]
+
+    statuses = set()
+    if untranslated:
+        statuses.add(matrix.UNTRANSLATED)
+    if fuzzy:
+        statuses.add(matrix.FUZZY)
+
+    def predicate(row):
+        cells = matrix.displayed_translations(row, key_idx)
+        if any(cells[i][0] in statuses for i in target_idxs):
+            return True
+        if baseline is not None:
+            key = row.ctx, row.key, row.plural
+            return any(baseline.get(key, locale) != cells[i]
+                       for i, locale in compared)
+        return False
+
+    return predicate
@@ -0,0 +1,127 @@
+"""
+Keyed comparison of PO catalogs.
+
+Entries are matched on their `(msgctxt, msgid, msgid_plural)` key through
+hash tables, so comparing two catalogs is linear in their size.
+"""
+
+import os
+import glob
+import collections
+
+from i18n_utils import parsing
+
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+FUZZY = 'fuzzy'
+OBSOLETED = 'obsoleted'
+UNOBSOLETED = 'unobsoleted'
+
+
+Change = collections.namedtuple('Change', 'kind key old new')
+
+
+def entry_key(entry):
+    return entry.msgctxt, entry.msgid, entry.msgid_plural
+
+
+def entry_msgstr(entry):
+    if entry.msgid_plural:
+        return [entry.msgstr_plural[k] for k in sorted(entry.msgstr_plural)]
+    return entry.msgstr
+
+
+def index(entries):
+    """
+    Maps the key of each entry to the entry itself, preferring non obsolete
+    entries if a key appears more than once.
+    """
+    idx = collections.OrderedDict()
+    for entry in entries:
+        key = entry_key(entry)
+        if key not in idx or idx[key].obsolete:
+            idx[key] = entry
+    return idx
+
+
+def diff_catalogs(old, new):
+    """
+    Compares two sequences of entries (usually two `POFile` instances),
+    yielding a `Change` for each difference.
+
+    Entries only present in `old` are reported as removed and entries only
+    present in `new` as added. For entries present in both, a change is
+    reported for each of the obsolete state, the fuzzy flag and the
+    translation if they differ.
+    """
+    old, new = index(old), index(new)
+
+    for key, old_entry in old.items():
+        new_entry = new.get(key)
+        if new_entry is None:
+            yield Change(REMOVED, key, entry_msgstr(old_entry), None)
+            continue
+
+        if old_entry.obsolete != new_entry.obsolete:
+            kind = OBSOLETED if new_entry.obsolete else UNOBSOLETED
+            yield Change(kind, key, old_entry.obsolete, new_entry.obsolete)
+
+        old_fuzzy = 'fuzzy' in old_entry.flags
+        new_fuzzy = 'fuzzy' in new_entry.flags
+        if old_fuzzy != new_fuzzy:
+            yield Change(FUZZY, key, old_fuzzy, new_fuzzy)
+
+        old_msgstr = entry_msgstr(old_entry)
+        new_msgstr = entry_msgstr(new_entry)
+        if old_msgstr != new_msgstr:
+            yield Change(CHANGED, key, old_msgstr, new_msgstr)
+
+    for key, new_entry in new.items():
+        if key not in old:
+            yield Change(ADDED, key, None, entry_msgstr(new_entry))
+
+
+def _relpaths(folder):
+    po_files = os.path.join(folder.path, '*', 'LC_MESSAGES', '*.po')
+    for path in glob.glob(po_files):
+        yield os.path.relpath(path, folder.path)
+
+
+def diff_folders(old, new, jobs=1, on_error=None):
+    """
+    Compares the PO files of two `LocaleFolder` instances, yielding
+    `(relpath, change)` pairs. Files are matched on their path relative to
+    the locale folder; a file missing on one side is compared to an empty
+    catalog. Files which cannot be parsed are skipped.
+    """
+    relpaths = sorted(set(_relpaths(old)) | set(_relpaths(new)))
+
+    paths = []
+    for relpath in relpaths:
+        for folder in (old, new):
+            path = os.path.join(folder.path, relpath)
+            if os.path.exists(path):
+                paths.append(path)
+
+    catalogs = parsing.parse_pofiles(paths, jobs, on_error)
+    current = next(catalogs, (None, None))
+
+    for relpath in relpaths:
+        pair, skip = [], False
+        for folder in (old, new):
+            path = os.path.join(folder.path, relpath)
+            if current[0] == path:
+                pair.append(current[1])
+                current = next(catalogs, (None, None))
+            else:
+                # Either missing or not parseable
+                skip = skip or os.path.exists(path)
+                pair.append([])
+
+        if skip:
+            continue
+
+        for change in diff_catalogs(*pair):
+            yield relpath, change
@@ -0,0 +1,168 @@
+"""
+Phase timings, counters and profiling of the commands.
+
+Commands decorated with `instrument` get a `--timings` option printing the
+wall time of each phase, the counters and the peak memory usage of the run
+to stderr, and a `--profile` option dumping cProfile statistics to a file.
+
+The same measures are available to Python code through hooks registered
+with `add_hook`, e.g. to send them to a metrics backend.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import sys
+import time
+import functools
+import contextlib
+import collections
+
+import click
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+_hooks = []
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+def add_hook(hook):
+    """
+    Registers a function to be called as `hook(timings, kind, name, value)`
+    for every measure recorded by any `Timings`: `kind` is `'phase'` (with
+    the elapsed seconds), `'count'` (with the increment) or, once the run
+    is over, `'finish'` (with `None` as name and the `as_dict()` summary).
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+def peak_rss(who='self'):
+    """
+    Returns the peak resident set size in bytes of the current process (or
+    of its terminated children), or `None` if it cannot be determined.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self'
+                               else resource.RUSAGE_CHILDREN)
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform == 'darwin':
+        return usage.ru_maxrss
+    return usage.ru_maxrss * 1024
+
+
+class Timings(object):
+    """
+    Accumulates the wall time spent in named phases and named counters.
+    """
+
+    def __init__(self, command=None):
+        self.command = command
+        self.phases = collections.OrderedDict()
+        self.counts = collections.OrderedDict()
+        self.start = timer()
+        self.elapsed = None
+
+    def _notify(self, kind, name, value):
+        for hook in _hooks:
+            hook(self, kind, name, value)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = timer()
+        try:
+            yield
+        finally:
+            elapsed = timer() - start
+            self.phases[name] = self.phases.get(name, 0) + elapsed
+            self._notify('phase', name, elapsed)
+
+    def iterate(self, name, iterable):
+        """
+        Iterates over `iterable`, accounting the time spent to produce each
+        item to the given phase.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+        self._notify('count', name, n)
+
+    def finish(self):
+        self.elapsed = timer() - self.start
+        self._notify('finish', None, self.as_dict())
+
+    def as_dict(self):
+        return {
+            'command': self.command,
+            'total': (self.elapsed if self.elapsed is not None
+                      else timer() - self.start),
+            'phases': dict(self.phases),
+            'counts': dict(self.counts),
+            'peak_rss': peak_rss(),
+            'peak_rss_children': peak_rss('children'),
+        }
+
+    def echo(self):
+        summary = self.as_dict()
+        lines = ['Timings:']
+        for name, seconds in self.phases.items():
+            lines.append('  {:<12} {:9.3f}s'.format(name, seconds))
+        lines.append('  {:<12} {:9.3f}s'.format('total', summary['total']))
+        if self.counts:
+            lines.append('Counts:')
+            for name, value in self.counts.items():
+                lines.append('  {:<12} {:>10}'.format(name, value))
+        for label, key in [('Peak RSS', 'peak_rss'),
+                           ('Peak RSS (workers)', 'peak_rss_children')]:
+            if summary[key]:
+                lines.append('{}: {:.1f} MiB'.format(
+                    label, summary[key] / 1024.0 / 1024.0))
+        click.echo('\n'.join(lines), err=True)
+
+
+def instrument(command):
+    """
+    Decorator adding the --timings and --profile options to a click command
+    function, which receives a `Timings` instance as `timings` argument.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(show_timings, profile_path, **kwargs):
+            timings = Timings(command)
+            profiler = None
+            if profile_path:
+                import cProfile
+                profiler = cProfile.Profile()
+                profiler.enable()
+            try:
+                return f(timings=timings, **kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    profiler.dump_stats(profile_path)
+                timings.finish()
+                if show_timings:
+                    timings.echo()
+
+        wrapper = click.option('--timings', 'show_timings',
+                               is_flag=True)(wrapper)
+        wrapper = click.option('--profile', 'profile_path',
+                               type=click.Path(dir_okay=False))(wrapper)
+        return wrapper
+    return decorator
@@ -0,0 +1,208 @@
+"""
+Columnar storage of the translations of a set of catalogs.
+
+A `TranslationMatrix` has one row per `(msgctxt, msgid, plural)` key and one
+column per locale. Instead of keeping the parsed entries alive, it stores
+for each locale an array of string ids and an array of status codes, and
+shares identical strings and occurrence lists between cells.
+"""
+
+import array
+import collections
+
+
+UNTRANSLATED = 0
+FUZZY = 1
+TRANSLATED = 2
+
+
+Row = collections.namedtuple('Row', [
+    'ctx', 'key', 'plural', 'pluralized', 'msgstrs', 'statuses',
+    'occurrences'])
+
+
+class StringTable(object):
+    """
+    Interns strings, mapping each of them to an integer id. The empty
+    string has always the id 0.
+    """
+
+    def __init__(self):
+        self._strings = ['']
+        self._ids = {'': 0}
+
+    def add(self, s):
+        try:
+            return self._ids[s]
+        except KeyError:
+            i = self._ids[s] = len(self._strings)
+            self._strings.append(s)
+            return i
+
+    def __getitem__(self, i):
+        return self._strings[i]
+
+    def __len__(self):
+        return len(self._strings)
+
+
+def displayed_translations(row, key_idx):
+    """
+    Returns the `(status, msgstr)` pairs of the row as exported: untranslated
+    cells are empty, except in the key locale where they show the key.
+    """
+    cells = []
+    for i, (msgstr, status) in enumerate(zip(row.msgstrs, row.statuses)):
+        if status != UNTRANSLATED:
+            cells.append((status, msgstr))
+        elif i == key_idx:
+            cells.append((TRANSLATED, row.key))
+        else:
+            cells.append((UNTRANSLATED, ''))
+    return cells
+
+
+def entry_status(entry, msgstr):
+    if not msgstr:
+        return UNTRANSLATED
+    if 'fuzzy' in entry.flags:
+        return FUZZY
+    if entry.obsolete:
+        return UNTRANSLATED
+    return TRANSLATED
+
+
+class TranslationMatrix(object):
+    """
+    Merges the entries of catalogs in different locales by key.
+
+    Entries are added with `add`; a plural entry fills two rows, one keyed
+    by its msgid (holding the first form) and one by its msgid_plural
+    (holding the second form). Once a cell holds a translation, later
+    entries with the same key in the same locale are ignored.
+
+    Iterating over the matrix yields a `Row` for each key, in insertion
+    order or in the order established by `sort`, and limited to the rows
+    selected by `filter`.
+    """
+
+    def __init__(self, locales):
+        self.locales = list(locales)
+        self._columns = dict((l, i) for i, l in enumerate(self.locales))
+
+        self._strings = StringTable()
+        self._references = {}
+        self._keys = []
+        self._rows = {}
+        self._order = None
+
+        self._msgstrs = [array.array('l') for l in self.locales]
+        self._statuses = [array.array('b') for l in self.locales]
+        self._plurals = [bytearray() for l in self.locales]
+        self._occurrences = [[] for l in self.locales]
+
+    def __len__(self):
+        if self._order is not None:
+            return len(self._order)
+        return len(self._keys)
+
+    def _row(self, key):
+        try:
+            return self._rows[key]
+        except KeyError:
+            row = self._rows[key] = len(self._keys)
+            self._keys.append(key)
+            for col in range(len(self.locales)):
+                self._msgstrs[col].append(0)
+                self._statuses[col].append(UNTRANSLATED)
+                self._plurals[col].append(0)
+                self._occurrences[col].append(None)
+            self._order = None
+            return row
+
+    def _set(self, row, col, entry, msgstr, references):
+        self._msgstrs[col][row] = self._strings.add(msgstr)
+        self._statuses[col][row] = entry_status(entry, msgstr)
+        self._plurals[col][row] = bool(entry.msgid_plural)
+        self._occurrences[col][row] = references
+
+    def add(self, locale, entry):
+        """
+        Adds the translation of the given entry (a `POEntry` or a
+        `records.Record`) in the given locale.
+        """
+        col = self._columns[locale]
+
+        references = tuple(entry.occurrences)
+        references = self._references.setdefault(references, references)
+
+        if entry.msgid_plural:
+            msgstr = entry.msgstr_plural.get(0, '').strip()
+        else:
+            msgstr = entry.msgstr.strip()
+
+        row = self._row((entry.msgctxt, entry.msgid.strip(), False))
+        if self._msgstrs[col][row]:
+            return
+        self._set(row, col, entry, msgstr, references)
+
+        if not entry.msgid_plural:
+            return
+
+        row = self._row((entry.msgctxt, entry.msgid_plural.strip(), True))
+        if self._msgstrs[col][row]:
+            return
+        msgstr = entry.msgstr_plural.get(1, '').strip()
+        self._set(row, col, entry, msgstr, references)
+
+    def sort(self):
+        """
+        Orders the rows by context and case insensitive key.
+        """
+        keys = self._keys
+        self._order = sorted(range(len(keys)), key=lambda i: (
+            keys[i][0] or '', keys[i][1].lower()))
+
+    def filter(self, predicate):
+        """
+        Keeps only the rows for which `predicate(row)` is true, in their
+        current order. Adding entries afterwards resets the selection.
+        """
+        order = self._order
+        if order is None:
+            order = range(len(self._keys))
+        self._order = [i for i in order if predicate(self.row(i))]
+
+    def row(self, i):
+        ctx, key, plural = self._keys[i]
+        columns = range(len(self.locales))
+
+        pluralized = plural
+        if not pluralized:
+            for col in columns:
+                if self._occurrences[col][i] is not None:
+                    pluralized = bool(self._plurals[col][i])
+                    break
+
+        occurrences = []
+        for col in columns:
+            references = self._occurrences[col][i]
+            if references is not None and references not in occurrences:
+                occurrences.append(references)
+
+        return Row(
+            ctx=ctx,
+            key=key,
+            plural=plural,
+            pluralized=pluralized,
+            msgstrs=[self._strings[self._msgstrs[col][i]] for col in columns],
+            statuses=[self._statuses[col][i] for col in columns],
+            occurrences=occurrences,
+        )
+
+    def __iter__(self):
+        order = self._order
+        if order is None:
+            order = range(len(self._keys))
+        for i in order:
+            yield self.row(i)
@@ -1,33 +1,76 @@
+import io
+import os
+import json
+import time
+import hashlib
+import textwrap
+import functools
+
 import six
 
 import polib
 
+import i18n_utils
+
 
 DEFAULT_WRAPPING_WIDTH = 78
 
 
-def one_occurrence_per_line(entry_str):
-    entry_lines = []
+def _wrap_comment(comment, prefix, wrapwidth):
+    if wrapwidth > 0 and len(comment) + len(prefix) > wrapwidth:
+        return textwrap.wrap(comment, wrapwidth, initial_indent=prefix,
+                             subsequent_indent=prefix,
+                             break_long_words=False)
+    return [u'%s%s' % (prefix, comment)]
+
+
+def iter_entry_unicode(entry, wrapwidth):
+    """
+    Generates the normalized representation of an entry, line by line.
+
+    This follows `polib.POEntry.__unicode__`, except that each occurrence is
+    put on a line by itself.
+    """
+    if entry.obsolete:
+        comments = [('tcomment', '# ')]
+    else:
+        comments = [('tcomment', '# '), ('comment', '#. ')]
+    for attr, prefix in comments:
+        value = getattr(entry, attr)
+        if value:
+            for comment in value.split('\n'):
+                for line in _wrap_comment(comment, prefix, wrapwidth):
+                    yield line + u'\n'
+
+    if not entry.obsolete:
+        for fpath, lineno in entry.occurrences:
+            occurrence = u'%s:%s' % (fpath, lineno) if lineno else fpath
+            for part in occurrence.split(' '):
+                yield u'#: %s\n' % part
+
+    if entry.flags:
+        yield u'#, %s\n' % ', '.join(entry.flags)
 
-    for line in entry_str.split('\n'):
-        if line.startswith('#: '):
-            line = line[3:]
-            for occurrence in line.split(' '):
-                entry_lines.append('#: {}'.format(occurrence))
-        else:
-            entry_lines.append(line)
+    prefix = '#~| ' if entry.obsolete else '#| '
+    for field in ['previous_msgctxt', 'previous_msgid',
+                  'previous_msgid_plural']:
+        value = getattr(entry, field)
+        if value is not None:
+            for line in entry._str_field(field, prefix, '', value, wrapwidth):
+                yield line + u'\n'
 
-    return u'\n'.join(entry_lines)
+    yield polib._BaseEntry.__unicode__(entry, wrapwidth)
 
 
 def entry_to_unicode(entry, wrapwidth):
-    return one_occurrence_per_line(entry.__unicode__(wrapwidth))
+    return u''.join(iter_entry_unicode(entry, wrapwidth))
 
 
 class NormalizedPOFile(polib.POFile):
-    def __unicode__(self):
+    def iter_unicode(self):
         """
-        Returns the normalized unicode representation of the file.
+        Generates the normalized unicode representation of the file in small
+        chunks (the header, then the entries line by line).
         """
         meta, headers = '', self.header.split('\n')
         for header in headers:
@@ -35,12 +78,204 @@ class NormalizedPOFile(polib.POFile):
                 meta += u'#%s\n' % header
             else:
                 meta += u'# %s\n' % header
+        yield meta
 
-        ret = []
         entries = [self.metadata_as_entry()]
         entries += sorted(self, key=lambda e: e.msgid)
-        for entry in entries:
-            ret.append(entry_to_unicode(entry, self.wrapwidth))
-        ret = u'\n'.join(ret)
-        assert isinstance(ret, six.text_type)
-        return meta + ret
+        for i, entry in enumerate(entries):
+            if i:
+                yield u'\n'
+            for chunk in iter_entry_unicode(entry, self.wrapwidth):
+                assert isinstance(chunk, six.text_type)
+                yield chunk
+
+    def __unicode__(self):
+        """
+        Returns the normalized unicode representation of the file.
+        """
+        return u''.join(self.iter_unicode())
+
+    def write(self, fh):
+        """
+        Writes the normalized representation of the file to the given text
+        file handle, without building it in memory first.
+        """
+        for chunk in self.iter_unicode():
+            fh.write(chunk)
+
+    def save(self, fpath=None, repr_method='__unicode__', newline=None):
+        if repr_method != '__unicode__':
+            return super(NormalizedPOFile, self).save(fpath, repr_method,
+                                                      newline)
+        if self.fpath is None and fpath is None:
+            raise IOError('You must provide a file path to save() method')
+        if fpath is None:
+            fpath = self.fpath
+
+        # Render to a temporary file next to the target and move it in place
+        # once complete, so that a failure or an interruption never leaves a
+        # truncated catalog behind. Only needed when saving, tempfile is slow
+        # to import.
+        import tempfile
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(fpath)), suffix='.tmp')
+        try:
+            with io.open(fd, 'w', encoding=self.encoding,
+                         newline=newline) as fh:
+                self.write(fh)
+            copy_mode(fpath, tmp_path)
+            os.rename(tmp_path, fpath)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        if self.fpath is None:
+            self.fpath = fpath
+
+
+def copy_mode(path, tmp_path):
+    """
+    Gives the temporary file replacing `path` the permissions of the file,
+    or the default ones for a new file (temporary files are private).
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(tmp_path, mode)
+
+
+def matches_file(pofile, path):
+    """
+    Compares the normalized representation of `pofile` to the content of the
+    file at `path` as it is read, stopping at the first difference.
+    """
+    with io.open(path, 'rt', encoding=pofile.encoding, newline='') as fh:
+        for chunk in pofile.iter_unicode():
+            if fh.read(len(chunk)) != chunk:
+                return False
+        return not fh.read(1)
+
+
+def check_file(path, wrapwidth=DEFAULT_WRAPPING_WIDTH):
+    """
+    Returns `True` if the given PO file is normalized. The file is never
+    written.
+    """
+    pofile = polib.pofile(path, wrapwidth=wrapwidth, klass=NormalizedPOFile)
+    return matches_file(pofile, path)
+
+
+def save_if_changed(pofile):
+    """
+    Writes the normalized representation of the file to disk, but only if it
+    differs from the current content of the file.
+
+    Returns `True` if the file was written.
+    """
+    if matches_file(pofile, pofile.fpath):
+        return False
+    pofile.save()
+    return True
+
+
+def normalize_file(path, wrapwidth=DEFAULT_WRAPPING_WIDTH, only_changed=False,
+                   catalogs=None):
+    """
+    Normalizes the given PO file in place, returning a `(written, seconds)`
+    pair. If `only_changed` is true, the file is only written if its
+    normalized content differs from the current one.
+
+    If a `cache.CatalogCache` is given, the file is parsed through it.
+    """
+    start = time.time()
+    parse = functools.partial(polib.pofile, wrapwidth=wrapwidth,
+                              klass=NormalizedPOFile)
+    if catalogs is None:
+        pofile = parse(path)
+    else:
+        pofile = catalogs.parse(parse, path)
+
+    if only_changed:
+        written = save_if_changed(pofile)
+    else:
+        pofile.save()
+        written = True
+    return written, time.time() - start
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with io.open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class NormalizationCache(object):
+    """
+    On-disk record of the PO files known to be normalized.
+
+    For each file the size, modification time and content hash it had when
+    it was last normalized are stored, together with the wrapwidth used.
+    The whole cache is discarded when the version of the tool changes.
+    """
+
+    def __init__(self, path, wrapwidth):
+        self.path = path
+        self.wrapwidth = wrapwidth
+        self.files = {}
+        try:
+            with io.open(path, 'rt', encoding='utf8') as fh:
+                data = json.load(fh)
+        except (IOError, OSError, ValueError):
+            return
+        if data.get('version') == i18n_utils.__version__:
+            self.files = data.get('files', {})
+
+    def _key(self, path):
+        return os.path.abspath(path)
+
+    def is_normalized(self, path):
+        """
+        Returns `True` if the file is known to be normalized, either because
+        it was not modified since it was last normalized or because its
+        content did not change.
+        """
+        record = self.files.get(self._key(path))
+        if record is None or record['wrapwidth'] != self.wrapwidth:
+            return False
+
+        stat = os.stat(path)
+        if (record['size'], record['mtime']) == (stat.st_size, stat.st_mtime):
+            return True
+
+        digest = file_digest(path)
+        if digest != record['sha1']:
+            return False
+
+        # Touched but unchanged, remember the new stat
+        self.add(path, digest)
+        return True
+
+    def add(self, path, digest=None):
+        """
+        Records the given file as normalized.
+        """
+        if digest is None:
+            digest = file_digest(path)
+        stat = os.stat(path)
+        self.files[self._key(path)] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha1': digest,
+            'wrapwidth': self.wrapwidth,
+        }
+
+    def save(self):
+        data = {'version': i18n_utils.__version__, 'files': self.files}
+        tmp_path = self.path + '.tmp'
+        with io.open(tmp_path, 'wt', encoding='utf8') as fh:
+            fh.write(six.text_type(json.dumps(data, sort_keys=True)))
+        os.rename(tmp_path, self.path)
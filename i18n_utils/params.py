@@ -1,9 +1,6 @@
-import os
-import glob
-
 import click
 
-import polib
+from i18n_utils.parsing import LocaleFolder
 
 
 class LocaleFolderParamType(click.Path):
@@ -17,21 +14,3 @@ class LocaleFolderParamType(click.Path):
     def convert(self, value, param, ctx):
         path = super(LocaleFolderParamType, self).convert(value, param, ctx)
         return LocaleFolder(path)
-
-
-class LocaleFolder(object):
-    def __init__(self, path):
-        self.path = path
-
-    def locales(self):
-        locales = os.path.join(self.path, '*', 'LC_MESSAGES')
-
-        for path in glob.glob(locales):
-            locale = os.path.basename(os.path.dirname(path))
-            yield locale
-
-    def pofiles(self, *args, **kwargs):
-        po_files = os.path.join(self.path, '*', 'LC_MESSAGES', '*.po')
-        for path in glob.glob(po_files):
-            locale = os.path.basename(os.path.dirname(os.path.dirname(path)))
-            yield locale, polib.pofile(path, *args, **kwargs)
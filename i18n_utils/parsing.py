@@ -0,0 +1,162 @@
+"""
+Parsing of the PO files of locale folders, optionally in parallel.
+"""
+
+import os
+import glob
+import functools
+import collections
+
+import click
+
+import polib
+
+from i18n_utils import records, stats
+
+
+class ParseErrors(list):
+    """
+    Error handler for `parse_pofiles` reporting every file which could not be
+    parsed and collecting their paths.
+    """
+
+    def __call__(self, path, error):
+        click.secho('Unable to parse "{}": {}'.format(path, error), fg='red',
+                    err=True)
+        self.append(path)
+
+    def check(self, exit_code=1):
+        if self:
+            error = click.ClickException(
+                '{} file(s) could not be parsed.'.format(len(self)))
+            error.exit_code = exit_code
+            raise error
+
+
+def _call(args):
+    func, item = args
+    try:
+        return func(item), None
+    except Exception as e:
+        return None, e
+
+
+def imap(func, items, jobs=1, window=None):
+    """
+    Applies `func` to each of the given items, yielding `(item, result,
+    error)` triples in the same order as the items. `error` is the exception
+    raised by `func`, if any.
+
+    If `jobs` is greater than one, the calls are distributed over a pool of
+    as many worker processes; `func` has then to be picklable. At most
+    `window` calls (twice the number of jobs by default) are in flight at
+    any time, so that results do not pile up if they are consumed slowly.
+    """
+    if jobs <= 1:
+        for item in items:
+            result, error = _call((func, item))
+            yield item, result, error
+        return
+
+    if window is None:
+        window = jobs * 2
+
+    # Imported here as it is slow to import and only needed for parallel runs
+    import multiprocessing
+    pool = multiprocessing.Pool(jobs)
+    pending = collections.deque()
+    try:
+        for item in items:
+            pending.append((item, pool.apply_async(_call, [(func, item)])))
+            if len(pending) >= window:
+                item, async_result = pending.popleft()
+                result, error = async_result.get()
+                yield item, result, error
+        while pending:
+            item, async_result = pending.popleft()
+            result, error = async_result.get()
+            yield item, result, error
+    finally:
+        pool.terminate()
+
+
+def parse_pofiles(paths, jobs=1, on_error=None, fields=None,
+                  skip_obsolete=False, cache=None, **kwargs):
+    """
+    Parses the given PO files, yielding `(path, pofile)` pairs in the same
+    order as the paths.
+
+    If `jobs` is greater than one, the files are parsed in a pool of as many
+    worker processes. If `on_error` is given, it is called with the path and
+    the exception of each file which could not be parsed and the file is
+    skipped, otherwise the exception is raised.
+
+    If `fields` is given, each file is parsed into a `records.Catalog` of
+    records holding only these fields instead of a `POFile`, optionally
+    leaving out obsolete entries (see `records.parse`).
+
+    If a `cache.CatalogCache` is given, the parsed files are loaded from and
+    stored to it.
+    """
+    if fields is None:
+        parse = functools.partial(polib.pofile, **kwargs)
+    else:
+        parse = functools.partial(records.parse, fields=tuple(fields),
+                                  skip_obsolete=skip_obsolete, **kwargs)
+
+    if cache is not None:
+        parse = functools.partial(cache.parse, parse)
+
+    try:
+        for path, pofile, error in imap(parse, paths, jobs):
+            if error is None:
+                yield path, pofile
+            elif on_error is None:
+                raise error
+            else:
+                on_error(path, error)
+    finally:
+        if cache is not None:
+            cache.evict()
+
+
+class LocaleFolder(object):
+    def __init__(self, path):
+        self.path = path
+
+    def locales(self):
+        locales = os.path.join(self.path, '*', 'LC_MESSAGES')
+
+        for path in glob.glob(locales):
+            locale = os.path.basename(os.path.dirname(path))
+            yield locale
+
+    def pofile_paths(self, locales=None):
+        po_files = os.path.join(self.path, '*', 'LC_MESSAGES', '*.po')
+        paths = []
+        for path in sorted(glob.glob(po_files)):
+            locale = os.path.basename(os.path.dirname(os.path.dirname(path)))
+            if locales is None or locale in locales:
+                paths.append(path)
+        return paths
+
+    def pofiles(self, locales=None, jobs=1, on_error=None, fields=None,
+                skip_obsolete=False, cache=None, **kwargs):
+        paths = self.pofile_paths(locales)
+        for path, pofile in parse_pofiles(paths, jobs, on_error, fields,
+                                          skip_obsolete, cache, **kwargs):
+            locale = os.path.basename(os.path.dirname(os.path.dirname(path)))
+            yield locale, pofile
+
+    def stats(self, locales=None, jobs=1, on_error=None, cache=None):
+        """
+        Computes the translation statistics of each PO file, yielding
+        `(locale, domain, stats.Stats)` triples.
+
+        The files are parsed as by `pofiles`, into records holding only the
+        fields the statistics need.
+        """
+        for locale, catalog in self.pofiles(locales, jobs, on_error,
+                                            stats.FIELDS, cache=cache):
+            domain = os.path.splitext(os.path.basename(catalog.fpath))[0]
+            yield locale, domain, stats.catalog_stats(catalog)
@@ -0,0 +1,79 @@
+"""
+Compact, read-only views of PO files.
+
+`polib.POEntry` objects carry every part of an entry (comments, previous
+msgids, ...) and weigh about a kilobyte each. Workloads which only read a
+few attributes of every entry of many catalogs can parse them into
+`Record` instances instead, which only hold the requested fields.
+"""
+
+import polib
+
+
+FIELDS = ('msgctxt', 'msgid', 'msgid_plural', 'msgstr', 'msgstr_plural',
+          'flags', 'obsolete', 'occurrences', 'comment', 'tcomment')
+
+
+class Record(object):
+    """
+    Lightweight stand-in for a `POEntry` holding a subset of its fields.
+
+    Fields which were not requested when parsing are not set, and accessing
+    them raises an `AttributeError`. List fields (flags and occurrences)
+    are stored as tuples.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for name in FIELDS
+                    if hasattr(self, name))
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return '<Record {!r}>'.format(getattr(self, 'msgid', None))
+
+
+class Catalog(list):
+    """
+    List of the records of a PO file.
+    """
+
+    def __init__(self, fpath, records=()):
+        super(Catalog, self).__init__(records)
+        self.fpath = fpath
+
+
+def from_entry(entry, fields):
+    values = {}
+    for name in fields:
+        value = getattr(entry, name)
+        if name in ('flags', 'occurrences'):
+            value = tuple(value)
+        values[name] = value
+    return Record(**values)
+
+
+def parse(path, fields=FIELDS, skip_obsolete=False, **kwargs):
+    """
+    Parses the given PO file into a `Catalog` of records holding only the
+    given fields. If `skip_obsolete` is true, obsolete entries are left out.
+
+    The remaining keyword arguments are passed to `polib.pofile`.
+    """
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+        raise ValueError('Unknown fields: {}'.format(
+            ', '.join(sorted(unknown))))
+
+    pofile = polib.pofile(path, **kwargs)
+    return Catalog(pofile.fpath, (
+        from_entry(entry, fields) for entry in pofile
+        if not (skip_obsolete and entry.obsolete)))
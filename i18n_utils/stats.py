@@ -0,0 +1,87 @@
+"""
+Translation progress statistics of PO files.
+"""
+
+import collections
+
+
+# The entry fields read to compute the statistics
+FIELDS = ('msgid', 'msgid_plural', 'msgstr', 'msgstr_plural', 'flags',
+          'obsolete')
+
+
+class Stats(collections.namedtuple('Stats', [
+        'translated', 'fuzzy', 'untranslated', 'obsolete',
+        'translated_words', 'fuzzy_words', 'untranslated_words',
+        'obsolete_words'])):
+    """
+    Number of entries and of source words (in the msgid and msgid_plural)
+    in each state. Stats can be summed.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def empty(cls):
+        return cls(*[0] * len(cls._fields))
+
+    def __add__(self, other):
+        return Stats(*[a + b for a, b in zip(self, other)])
+
+    @property
+    def total(self):
+        return self.translated + self.fuzzy + self.untranslated
+
+    @property
+    def total_words(self):
+        return (self.translated_words + self.fuzzy_words +
+                self.untranslated_words)
+
+    @property
+    def progress(self):
+        """
+        Percentage of the current (not obsolete) entries which are
+        translated.
+        """
+        if not self.total:
+            return 100.0
+        return 100.0 * self.translated / self.total
+
+    def as_dict(self):
+        d = self._asdict()
+        d['total'] = self.total
+        d['total_words'] = self.total_words
+        d['progress'] = round(self.progress, 1)
+        return d
+
+
+def entry_state(entry):
+    if entry.obsolete:
+        return 'obsolete'
+    if 'fuzzy' in entry.flags:
+        return 'fuzzy'
+    if entry.msgid_plural:
+        translated = entry.msgstr_plural and all(entry.msgstr_plural.values())
+    else:
+        translated = entry.msgstr
+    return 'translated' if translated else 'untranslated'
+
+
+def count_words(entry):
+    words = len(entry.msgid.split())
+    if entry.msgid_plural:
+        words += len(entry.msgid_plural.split())
+    return words
+
+
+def catalog_stats(catalog):
+    """
+    Computes the `Stats` of the given catalog, a `polib.POFile` or a
+    `records.Catalog` holding at least the `FIELDS`.
+    """
+    counts = dict.fromkeys(Stats._fields, 0)
+    for entry in catalog:
+        state = entry_state(entry)
+        counts[state] += 1
+        counts[state + '_words'] += count_words(entry)
+    return Stats(**counts)
@@ -5,28 +5,49 @@ from openpyxl.styles import Protection
 from .utils import memoize
 
 
-cell_fills = [
-    PatternFill(
-        fill_type=fills.FILL_SOLID,
-        start_color='E6EFD7',
-    ),
-    PatternFill(
-        fill_type=fills.FILL_SOLID,
-        start_color='FFFFFF',
-    ),
-]
-font = Font(name='Tahoma')
-alignment = Alignment(
-    vertical='center',
-    shrink_to_fit=True,
-    wrap_text=True,
-    indent=1,
-)
-border = Side(border_style=borders.BORDER_THIN, color='B8D08A')
+# Styles are built on first use, so that importing this module stays cheap
 header_border = line_height = 13
-title_style = Style(
-    font=Font(name='Tahoma', size=20, bold=True)
-)
+
+
+@memoize
+def cell_fills():
+    return [
+        PatternFill(
+            fill_type=fills.FILL_SOLID,
+            start_color='E6EFD7',
+        ),
+        PatternFill(
+            fill_type=fills.FILL_SOLID,
+            start_color='FFFFFF',
+        ),
+    ]
+
+
+@memoize
+def font():
+    return Font(name='Tahoma')
+
+
+@memoize
+def alignment():
+    return Alignment(
+        vertical='center',
+        shrink_to_fit=True,
+        wrap_text=True,
+        indent=1,
+    )
+
+
+@memoize
+def border():
+    return Side(border_style=borders.BORDER_THIN, color='B8D08A')
+
+
+@memoize
+def title_style():
+    return Style(
+        font=Font(name='Tahoma', size=20, bold=True)
+    )
 
 
 @memoize
@@ -58,7 +79,7 @@ def column_header():
 @memoize
 def row_header(is_odd, is_last):
     return Style(
-        font=font,
+        font=font(),
         alignment=Alignment(
             vertical='center',
             horizontal='center' if is_last else 'left',
@@ -67,13 +88,13 @@ def row_header(is_odd, is_last):
             indent=int(not is_last),
         ),
         border=Border(
-            left=border,
+            left=border(),
             right=(Side(border_style=borders.BORDER_DOUBLE, color='8BB048')
-                   if is_last else border),
-            top=border,
-            bottom=border,
+                   if is_last else border()),
+            top=border(),
+            bottom=border(),
         ),
-        fill=cell_fills[int(bool(is_odd))],
+        fill=cell_fills()[int(bool(is_odd))],
         protection=Protection(),
     )
 
@@ -81,18 +102,18 @@ def row_header(is_odd, is_last):
 @memoize
 def translation_cell(is_odd):
     return Style(
-        font=font,
+        font=font(),
         alignment=Alignment(
             vertical='center',
             shrink_to_fit=True,
             wrap_text=True,
         ),
         border=Border(
-            right=border,
-            top=border,
-            bottom=border,
+            right=border(),
+            top=border(),
+            bottom=border(),
         ),
-        fill=cell_fills[int(bool(is_odd))],
+        fill=cell_fills()[int(bool(is_odd))],
         protection=Protection(locked=False),
     )
 
@@ -100,17 +121,17 @@ def translation_cell(is_odd):
 @memoize
 def translation_cb_cell(is_odd):
     return Style(
-        font=font,
+        font=font(),
         alignment=Alignment(
             vertical='center',
             horizontal='center',
         ),
         border=Border(
-            left=border,
-            top=border,
-            bottom=border,
+            left=border(),
+            top=border(),
+            bottom=border(),
         ),
-        fill=cell_fills[int(bool(is_odd))],
+        fill=cell_fills()[int(bool(is_odd))],
         protection=Protection(locked=False),
     )
 
@@ -127,10 +148,10 @@ def occurrences_cell(is_odd):
             wrap_text=True,
         ),
         border=Border(
-            right=border,
-            top=border,
-            bottom=border,
+            right=border(),
+            top=border(),
+            bottom=border(),
         ),
-        fill=cell_fills[int(bool(is_odd))],
+        fill=cell_fills()[int(bool(is_odd))],
         protection=Protection(locked=False),
     )
@@ -1,13 +1,58 @@
+import threading
 import functools
+import collections
 
 
-def memoize(obj):
-    cache = obj.cache = {}
+CacheInfo = collections.namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+
+def memoize(obj=None, maxsize=None):
+    """
+    Caches the results of `obj` by its arguments.
+
+    Can be used either as `@memoize` or as `@memoize(maxsize=...)`. When
+    `maxsize` is given, the least recently used results are evicted once
+    the cache holds that many of them. The cache is thread-safe; the
+    decorated function exposes `cache_info()` and `cache_clear()`.
+    """
+    if obj is None:
+        return functools.partial(memoize, maxsize=maxsize)
+
+    cache = obj.cache = collections.OrderedDict()
+    lock = threading.RLock()
+    stats = {'hits': 0, 'misses': 0}
 
     @functools.wraps(obj)
     def memoizer(*args, **kwargs):
-        key = (args, tuple(kwargs.items()))
-        if key not in cache:
-            cache[key] = obj(*args, **kwargs)
-        return cache[key]
+        key = (args, tuple(sorted(kwargs.items())))
+        with lock:
+            if key in cache:
+                stats['hits'] += 1
+                if maxsize is not None:
+                    # Mark as the most recently used
+                    cache[key] = cache.pop(key)
+                return cache[key]
+            stats['misses'] += 1
+
+        value = obj(*args, **kwargs)
+
+        with lock:
+            cache[key] = value
+            if maxsize is not None:
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+        return value
+
+    def cache_info():
+        with lock:
+            return CacheInfo(stats['hits'], stats['misses'], maxsize,
+                             len(cache))
+
+    def cache_clear():
+        with lock:
+            cache.clear()
+            stats['hits'] = stats['misses'] = 0
+
+    memoizer.cache_info = cache_info
+    memoizer.cache_clear = cache_clear
     return memoizer
@@ -0,0 +1,281 @@
+"""
+Write-only workbook support for the spreadsheet exports.
+
+openpyxl's write-only worksheets stream rows to a temporary file as they are
+appended, but do not support row heights, merged cells and conditional
+formatting. The classes in this module add them back, so that an export can
+be written sequentially without keeping the grid in memory.
+
+They replace parts of openpyxl's write-only worksheet and reuse its writer
+internals, which change between releases: openpyxl is pinned to 2.2.x.
+"""
+
+import collections
+from inspect import isgenerator
+
+from openpyxl import Workbook
+from openpyxl.compat import safe_string
+from openpyxl.cell import get_column_letter, Cell
+from openpyxl.styles.numbers import BUILTIN_FORMATS_REVERSE
+from openpyxl.styles.styleable import StyleId
+from openpyxl.worksheet.dimensions import ColumnDimension, RowDimension
+from openpyxl.worksheet.properties import write_sheetPr
+from openpyxl.writer.dump_worksheet import DumpWorksheet, WriteOnlyCell
+from openpyxl.writer.worksheet import (
+    write_autofilter,
+    write_cell,
+    write_cols,
+    write_conditional_formatting,
+    write_datavalidation,
+    write_format,
+    write_mergecells,
+)
+from openpyxl.xml.constants import SHEET_MAIN_NS, REL_NS
+from openpyxl.xml.functions import xmlfile, Element, SubElement
+
+
+# Written in place of the dimension of the sheet until it is known, it is as
+# long as the largest possible reference so that it can be overwritten
+DIMENSION_PLACEHOLDER = 'A1:XFD1048576'
+
+
+class StreamingWorksheet(DumpWorksheet):
+    """
+    Write-only worksheet supporting row heights, merged cells and
+    conditional formatting.
+
+    Everything except the rows themselves (column widths, sheet view, frozen
+    panes, ...) has to be set before the first row is appended. The height
+    of a row has to be set with `set_row_height` before appending it.
+    """
+
+    def merge_cells(self, range_string):
+        if range_string not in self._merged_cells:
+            self._merged_cells.append(range_string)
+
+    def _write_header(self):
+        with xmlfile(self.filename) as xf:
+            with xf.element('worksheet', xmlns=SHEET_MAIN_NS):
+                xf.write(write_sheetPr(self.sheet_properties))
+                xf.write(Element('dimension', ref=DIMENSION_PLACEHOLDER))
+                views = Element('sheetViews')
+                views.append(self.sheet_view.to_tree())
+                xf.write(views)
+                xf.write(write_format(self))
+
+                cols = write_cols(self)
+                if cols is not None:
+                    xf.write(cols)
+
+                with xf.element('sheetData'):
+                    try:
+                        while True:
+                            r = (yield)
+                            xf.write(r)
+                    except GeneratorExit:
+                        pass
+
+                if self.protection.sheet:
+                    prot = Element('sheetProtection', dict(self.protection))
+                    xf.write(prot)
+
+                af = write_autofilter(self)
+                if af is not None:
+                    xf.write(af)
+
+                merge = write_mergecells(self)
+                if merge is not None:
+                    xf.write(merge)
+
+                for cf in write_conditional_formatting(self):
+                    xf.write(cf)
+
+                dv = write_datavalidation(self)
+                if dv is not None:
+                    xf.write(dv)
+
+                xf.write(Element('pageMargins', dict(self.page_margins)))
+
+                if self._comments:
+                    comments = Element('legacyDrawing',
+                                       {'{%s}id' % REL_NS: 'commentsvml'})
+                    xf.write(comments)
+
+    def close(self):
+        super(StreamingWorksheet, self).close()
+        self._write_dimension()
+
+    def _write_dimension(self):
+        """
+        Overwrites the placeholder written in the header with the dimension
+        of the sheet, padding the element with spaces.
+        """
+        placeholder = ('ref="%s"' % DIMENSION_PLACEHOLDER).encode('ascii')
+        ref = 'ref="A1:%s%d"' % (get_column_letter(self._max_col or 1),
+                                 self._max_row or 1)
+        ref = ref.encode('ascii').ljust(len(placeholder))
+        with open(self.filename, 'r+b') as fh:
+            # The dimension comes right after the sheet properties
+            offset = fh.read(4096).index(placeholder)
+            fh.seek(offset)
+            fh.write(ref)
+
+    def append(self, row):
+        if (not isgenerator(row) and
+                not isinstance(row, (list, tuple, range))):
+            self._invalid_row(row)
+
+        self._max_row += 1
+        row_idx = self._max_row
+        if self.writer is None:
+            self.writer = self._write_header()
+            next(self.writer)
+
+        attrs = {'r': '%d' % row_idx}
+        dimension = self.row_dimensions.pop(row_idx, None)
+        if dimension is not None:
+            attrs.update(dict(dimension))
+        el = Element('row', attrs)
+
+        cell = WriteOnlyCell(self)
+        col_idx = None
+        for col_idx, value in enumerate(row, 1):
+            if value is None:
+                continue
+
+            if isinstance(value, Cell):
+                cell = value
+            else:
+                cell.value = value
+
+            cell.coordinate = '%s%d' % (get_column_letter(col_idx), row_idx)
+            if isinstance(cell, StyledCell):
+                el.append(write_styled_cell(self, cell))
+            else:
+                el.append(write_cell(self, cell))
+            if cell.has_style:
+                cell = WriteOnlyCell(self)
+
+        if col_idx:
+            self._max_col = max(self._max_col, col_idx)
+            el.set('spans', '1:%d' % col_idx)
+        try:
+            self.writer.send(el)
+        except StopIteration:
+            self._already_saved()
+
+
+class StreamingWorkbook(Workbook):
+    """
+    Write-only workbook creating `StreamingWorksheet` sheets.
+    """
+
+    _optimized_worksheet_class = StreamingWorksheet
+
+    def __init__(self, **kwargs):
+        kwargs['write_only'] = True
+        super(StreamingWorkbook, self).__init__(**kwargs)
+
+
+class StyledCell(Cell):
+    """
+    Cell created with a `CellStyle`, carrying the index of its cell format.
+    """
+
+    __slots__ = ('xf',)
+
+
+def write_styled_cell(ws, cell):
+    """
+    Same as `write_cell`, but uses the precomputed cell format index of a
+    `StyledCell` instead of looking it up.
+    """
+    if cell.data_type == 'f':
+        return write_cell(ws, cell)
+
+    attributes = {'r': cell.coordinate}
+    if cell.xf:
+        attributes['s'] = '%d' % cell.xf
+    attributes['t'] = cell.data_type
+
+    el = Element('c', attributes)
+    value = cell.internal_value
+    if value in ('', None):
+        return el
+
+    if cell.data_type == 's':
+        value = ws.parent.shared_strings.add(value)
+    SubElement(el, 'v').text = safe_string(value)
+    return el
+
+
+CellStyle = collections.namedtuple('CellStyle', [
+    'font', 'fill', 'border', 'alignment', 'protection', 'number_format',
+    'xf'])
+
+
+def register_style(wb, style):
+    """
+    Interns the formatting objects of `style` and the cell format combining
+    them in the given workbook, and returns a `CellStyle` holding their ids.
+
+    Applying a `CellStyle` to a cell only sets these ids, while assigning a
+    `Style` copies, hashes and looks up each of its formatting objects again
+    for every cell, and writing the cell looks up its cell format again.
+    """
+    number_format = style.number_format
+    if number_format in BUILTIN_FORMATS_REVERSE:
+        number_format_id = BUILTIN_FORMATS_REVERSE[number_format]
+    else:
+        number_format_id = wb._number_formats.add(number_format) + 164
+
+    ids = dict(
+        font=wb._fonts.add(style.font),
+        fill=wb._fills.add(style.fill),
+        border=wb._borders.add(style.border),
+        alignment=wb._alignments.add(style.alignment),
+        protection=wb._protections.add(style.protection),
+        number_format=number_format_id,
+    )
+    xf = wb._cell_styles.add(StyleId(
+        fontId=ids['font'],
+        fillId=ids['fill'],
+        borderId=ids['border'],
+        alignmentId=ids['alignment'],
+        protectionId=ids['protection'],
+        numFmtId=ids['number_format'],
+    ))
+    return CellStyle(xf=xf, **ids)
+
+
+def cell(ws, value=None, style=None):
+    """
+    Creates a detached cell to be appended to the given write-only sheet.
+
+    The style can either be a `Style` or a `CellStyle` registered in the
+    workbook of the sheet.
+    """
+    if isinstance(style, CellStyle):
+        c = StyledCell(ws, 'A', 1, value)
+        c.xf = style.xf
+        c._font_id = style.font
+        c._fill_id = style.fill
+        c._border_id = style.border
+        c._alignment_id = style.alignment
+        c._protection_id = style.protection
+        c._number_format_id = style.number_format
+    else:
+        c = WriteOnlyCell(ws, value)
+        if style is not None:
+            c.style = style
+    return c
+
+
+def set_column_width(ws, column, width):
+    letter = get_column_letter(column)
+    ws.column_dimensions[letter] = ColumnDimension(ws, index=letter,
+                                                   width=width)
+
+
+def set_row_height(ws, row, height):
+    ws.row_dimensions[row] = RowDimension(ws, index=row, ht=height)
@@ -0,0 +1,44 @@
+"""
+Reading of the workbooks written by msgtoxls.
+"""
+
+import re
+
+
+LOCALE_HEADER_RE = re.compile(r'^=CONCATENATE\(\s*"(.+?) \(')
+
+
+def detect_languages(headers, available):
+    """
+    Finds the translation columns in the header row written by msgtoxls,
+    returning `(language, trans_col)` pairs, with one based translation
+    columns, for each of the `available` languages having one.
+    """
+    by_name = dict((language.upper(), language) for language in available)
+    found = []
+    for i, value in enumerate(headers):
+        match = LOCALE_HEADER_RE.match(value or '')
+        if match and match.group(1) in by_name:
+            # The header is written above the flag column
+            found.append((by_name[match.group(1)], i + 2))
+    return found
+
+
+def read_sheet(workbook, sheet=1, skip=0, stream=True):
+    """
+    Opens the given (one based) sheet of a workbook, given as a path or a
+    binary file object, returning the sheet, an iterator over the rows
+    following the header row and the values of the header row.
+    """
+    # openpyxl is slow to import, so it is only loaded when actually needed
+    from openpyxl import load_workbook
+
+    # In streaming mode only the selected sheet is parsed, one row at a time
+    wb = load_workbook(workbook, read_only=stream)
+    ws = wb.worksheets[sheet-1]
+    rows = iter(ws.iter_rows())
+
+    for i in range(skip):
+        next(rows)
+    headers = [cell.value for cell in next(rows)]
+    return ws, rows, headers